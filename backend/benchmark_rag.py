@@ -0,0 +1,243 @@
+"""
+Offline RAG benchmark (no Groq, no Redis, no real data touched).
+
+Builds a synthetic knowledge base in a temporary Chroma directory, growing it
+step by step (e.g. 1k -> 10k -> 100k chunks), and at every size reports:
+
+- ingest time and chunks/s for the step
+- retrieval recall@k (does the chunk a question was written from make it into the prompt?)
+- /ai/ask latency percentiles and QPS at a fixed concurrency, through the real
+  router (httpx ASGITransport) with the fake LLM provider
+- average time per RAG stage (from src/ai_core/metrics.py)
+
+Examples:
+    python benchmark_rag.py
+    python benchmark_rag.py --sizes 1000,10000,100000,1000000 --fake-embeddings --concurrency 16
+    python benchmark_rag.py --backend quantized --sizes 10000,100000
+    python benchmark_rag.py --json benchmark.json
+
+--fake-embeddings swaps MiniLM for a hashing bag-of-words embedding so very large
+collections can be built in minutes; recall numbers are then only comparable to
+other --fake-embeddings runs.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import asyncio
+import tempfile
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+FIRST_NAMES = "ama kofi yaw akosua kwame abena kojo efua kwesi adwoa francis esi".split()
+LAST_NAMES = "mensah owusu boateng asante osei appiah sewor addo darko amoah ofori agyei".split()
+CITIES = "accra kumasi tamale takoradi cape-coast ho koforidua sunyani tema wa bolgatanga".split()
+WORDS = (
+    "solar cocoa fintech logistics health water school market farm drone clinic "
+    "radio mobile credit energy transport textile fishing mining tourism recycling"
+).split()
+
+
+def make_corpus(start: int, stop: int, seed: int) -> list[tuple[str, str, str]]:
+    """(text, question, kind) for records start..stop-1, the same every run for a given seed."""
+    records = []
+    for i in range(start, stop):
+        rng = random.Random(seed * 1_000_003 + i)
+        code = f"prj{i:07d}"
+        lead = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        topic = f"{rng.choice(WORDS)} {rng.choice(WORDS)}"
+        city = rng.choice(CITIES)
+        budget = rng.randrange(10_000, 5_000_000, 1000)
+        text = (
+            f"Record {i}: project {code} is a {topic} initiative based in {city}. "
+            f"It is led by {lead} and has a budget of {budget} cedis."
+        )
+        if rng.random() < 0.5:
+            question, kind = f"Who leads project {code}?", "exact"
+        else:
+            question, kind = f"Which {topic} project in {city} has a budget of {budget} cedis?", "descriptive"
+        records.append((text, question, kind))
+    return records
+
+
+class HashingEmbeddings(Embeddings):
+    """Bag-of-words hashed into 384 signed buckets; fast stand-in for MiniLM."""
+
+    dim = 384
+
+    def _embed(self, text: str) -> list[float]:
+        from src.ai_core.keyword_index import tokenize
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            vector[h % self.dim] += 1.0 if (h >> 63) else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(np.asarray(values) * 1000, [50, 95, 99])
+    return {"p50": round(float(p50), 2), "p95": round(float(p95), 2), "p99": round(float(p99), 2)}
+
+
+def stage_means(before: dict, after: dict) -> dict:
+    """Mean ms per stage between two STAGE_SECONDS.totals() snapshots."""
+    means = {}
+    for key, (count, total) in after.items():
+        count -= before.get(key, (0, 0.0))[0]
+        total -= before.get(key, (0, 0.0))[1]
+        if count:
+            means[key[0]] = round(1000 * total / count, 2)
+    return means
+
+
+async def ask_load(client, questions: list[str], concurrency: int) -> tuple[list[float], float, int]:
+    """Replays the questions against /ai/ask; returns (latencies, wall seconds, errors)."""
+    slots = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def one(question: str):
+        nonlocal errors
+        async with slots:
+            started = time.perf_counter()
+            response = await client.post("/ai/ask", json={"question": question})
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in questions))
+    return latencies, time.perf_counter() - started, errors
+
+
+async def run(args) -> list[dict]:
+    # imported here: the env vars set in main() must be in place before config loads
+    import httpx
+    from fastapi import FastAPI
+    from src.ai_core import config, metrics, retrieval, store
+    from src.ai_core.router import aiApp
+
+    if args.fake_embeddings:
+        store._embeddings = HashingEmbeddings() # picked up by get_embeddings() on first use
+
+    app = FastAPI()
+    app.include_router(aiApp)
+    # questions carry no agent_id or token, so /ai/ask never touches the database
+    transport = httpx.ASGITransport(app=app)
+    rng = random.Random(args.seed)
+    results = []
+    size_done = 0
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        for size in args.sizes:
+            # ---------- ingest the next slice of the corpus ----------
+            ingest_seconds = 0.0
+            added = 0
+            for start in range(size_done, size, args.ingest_batch):
+                texts = [text for text, _, _ in make_corpus(start, min(start + args.ingest_batch, size), args.seed)]
+                started = time.perf_counter()
+                added += (await asyncio.to_thread(store.ingest_documents, texts))["added"]
+                ingest_seconds += time.perf_counter() - started
+            size_done = size
+
+            # ---------- questions about random records ingested so far ----------
+            sample = [make_corpus(i, i + 1, args.seed)[0] for i in rng.sample(range(size), min(args.questions, size))]
+
+            stages_before = metrics.STAGE_SECONDS.totals()
+            hits = {"exact": [0, 0], "descriptive": [0, 0]}
+            retrieve_latencies = []
+            for text, question, kind in sample:
+                started = time.perf_counter()
+                docs, _ = await asyncio.to_thread(retrieval.retrieve_context, question)
+                retrieve_latencies.append(time.perf_counter() - started)
+                hits[kind][0] += store.document_id(text) in {doc.id for doc in docs}
+                hits[kind][1] += 1
+
+            # ---------- /ai/ask under load ----------
+            questions = [question for _, question, _ in sample]
+            latencies, wall, errors = await ask_load(client, questions, args.concurrency)
+
+            found = sum(h for h, _ in hits.values())
+            result = {
+                "chunks": size,
+                "added": added,
+                "ingest_seconds": round(ingest_seconds, 2),
+                "ingest_chunks_per_second": round(added / ingest_seconds, 1) if ingest_seconds else None,
+                f"recall@{config.RETRIEVER_K}": round(found / len(sample), 3),
+                "recall_by_kind": {kind: round(h / n, 3) if n else None for kind, (h, n) in hits.items()},
+                "retrieve_ms": percentiles(retrieve_latencies),
+                "ask_ms": percentiles(latencies),
+                "qps": round(len(questions) / wall, 1) if wall else None,
+                "errors": errors,
+                "stage_ms_mean": stage_means(stages_before, metrics.STAGE_SECONDS.totals()),
+            }
+            results.append(result)
+            print(json.dumps(result), flush=True)
+    return results
+
+
+def print_table(results: list[dict], k: int):
+    print()
+    print(f"{'chunks':>10} {'ingest s':>9} {'chunks/s':>9} {f'recall@{k}':>9} {'retr p50':>9} "
+          f"{'ask p50':>8} {'ask p95':>8} {'ask p99':>8} {'qps':>7}")
+    for r in results:
+        print(
+            f"{r['chunks']:>10} {r['ingest_seconds']:>9} {str(r['ingest_chunks_per_second']):>9} "
+            f"{r[f'recall@{k}']:>9} {str(r['retrieve_ms']['p50']):>9} {str(r['ask_ms']['p50']):>8} "
+            f"{str(r['ask_ms']['p95']):>8} {str(r['ask_ms']['p99']):>8} {str(r['qps']):>7}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline RAG retrieval / load benchmark")
+    parser.add_argument("--sizes", default="1000,10000", help="collection sizes to measure, comma separated (growing)")
+    parser.add_argument("--questions", type=int, default=200, help="questions replayed at every size")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent /ai/ask requests")
+    parser.add_argument("--ingest-batch", type=int, default=20000, help="texts per ingest call")
+    parser.add_argument("--backend", choices=("chroma", "quantized"), default="chroma", help="vector backend")
+    parser.add_argument("--fake-embeddings", action="store_true", help="hashing embeddings instead of MiniLM")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--data-dir", default=None, help="where to build the collection (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep the data dir afterwards")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    args = parser.parse_args()
+    args.sizes = sorted(int(s) for s in args.sizes.split(","))
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="rag-benchmark-")
+    os.environ["AI_VECTOR_DB_PATH"] = os.path.join(data_dir, "chroma_db")
+    os.environ["AI_KEYWORD_INDEX_PATH"] = os.path.join(data_dir, "keyword_index")
+    os.environ["AI_EMBEDDING_CACHE_PATH"] = os.path.join(data_dir, "embedding_cache")
+    os.environ["AI_QUANTIZED_INDEX_PATH"] = os.path.join(data_dir, "quantized_index")
+    os.environ["AI_VECTOR_BACKEND"] = args.backend
+    os.environ["AI_LLM_PROVIDER"] = "fake"
+    os.environ["AI_CACHE_ENABLED"] = "0"  # measure the pipeline, not Redis
+    print(f"Benchmark data in {data_dir}", file=sys.stderr)
+
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if not args.keep and not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    from src.ai_core import config
+    print_table(results, config.RETRIEVER_K)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,18 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from src.middleware.cors_validation import cors_validation_middleware
 from src.middleware.error_response_wrapper import register_exception_handlers
 from src.middleware.security import security_headers_middleware
-from src.middleware.success_response_wrapper import SuccessResponseWrapperMiddleware
+from src.middleware.success_response_wrapper import EnvelopeJSONResponse, envelope_context
 from src.middleware.whitelisting_middleware import IPWhitelist
 from src.shared import override_docs
 from contextlib import asynccontextmanager
 from src.db.session import init_db
 from src.ai_core.router import aiApp
+from src.ai_core.engine import ai_engine
+from src.ai_core import metrics as ai_metrics
+from fastapi.responses import Response
+import asyncio
+import logging
 import os
 from src.config import Config
 from redis.asyncio import Redis
@@ -21,13 +26,27 @@ from src.objects.agents.router import agentApp
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Folder where __init__.py is located
 GEOIP_DB_PATH = os.path.join(BASE_DIR, "GeoLite2-Country.mmdb")
 redis = Redis.from_url(Config.REDIS_URL, decode_responses=True)  # type: ignore
+logger = logging.getLogger("uvicorn.error")
+
+def _report_ai_startup(task: asyncio.Task):
+    """Logs a failed AI start-up (a background task's exception is otherwise never retrieved)."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("AI engine start-up failed; /ai/ready stays false", exc_info=task.exception())
 
 @asynccontextmanager
 async def life_span(app: FastAPI):
     """Run tasks when the app starts and stops."""
     print("Server Is Starting up...")
     await init_db()  # Initialize database connection/session
+    # Load the AI models in the background: the rest of the API is usable
+    # right away and /ai/ready reports when the AI engine can take traffic
+    ai_startup = asyncio.create_task(ai_engine.start_async())
+    ai_startup.add_done_callback(_report_ai_startup)
     yield
+    if not ai_startup.done():
+        ai_startup.cancel()
+        await asyncio.gather(ai_startup, return_exceptions=True)
+    await ai_engine.stop_async()
     print("Server Is Shutting down...")
 
 # Create the FastAPI app instance
@@ -37,7 +56,10 @@ app = FastAPI(
     version="1.0.0",
     docs_url=None,  # Disable default Swagger docs (for security)
     redoc_url=None,  # Disable ReDoc docs
-    lifespan=life_span
+    lifespan=life_span,
+    # successful JSON responses are wrapped with model_response while they are rendered
+    default_response_class=EnvelopeJSONResponse,
+    dependencies=[Depends(envelope_context)],
 )
 
 # ========================
@@ -62,9 +84,6 @@ app.add_middleware(
 app.middleware("http")(cors_validation_middleware)
 app.middleware("http")(security_headers_middleware)
 
-# 4️⃣ Success response wrapper (runs last)
-app.add_middleware(SuccessResponseWrapperMiddleware)
-
 # Redis Rate Limiting Middleware
 # app.add_middleware(
 #     RedisRateLimitMiddleware,
@@ -91,3 +110,9 @@ async def home():
     """Test route to confirm the server is working."""
     return {"message": "Welcome, Ghana!"}
 
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint (AI engine stage timings and counters, this worker)."""
+    return Response(content=ai_metrics.render(), media_type=ai_metrics.CONTENT_TYPE)
+
@@ -0,0 +1,223 @@
+import base64
+import hashlib
+import json
+import logging
+import time
+import numpy as np
+import redis
+from starlette.concurrency import run_in_threadpool
+from src.config import Config
+from src.shared.services.redis_service import redis_service
+from . import config, metrics
+
+logger = logging.getLogger("uvicorn.error")
+
+PREFIX = "ai:answers"
+
+
+def _normalize(question: str) -> str:
+    return " ".join(question.lower().split())
+
+
+def _encode_vector(vector: np.ndarray) -> str:
+    return base64.b64encode(vector.astype(np.float32).tobytes()).decode("ascii")
+
+
+def _decode_vector(raw: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(raw), dtype=np.float32)
+
+
+class SemanticAnswerCache:
+    """
+    Answers repeated questions from Redis instead of re-running the RAG chain.
+
+    - exact hits: same question after lower-casing / whitespace cleanup
+    - near hits: a cached question whose MiniLM embedding is at least
+      AI_CACHE_SIMILARITY similar (cosine)
+
+    Redis layout (every agent has its own keys, under a "generation" number):
+        ai:answers:{scope}:gen                -> current generation
+        ai:answers:{scope}:{gen}:{hash}       -> {"question", "answer"} with TTL
+        ai:answers:{scope}:{gen}:vectors      -> hash of question embeddings
+        ai:answers:{scope}:{gen}:lru          -> sorted set, score = last access time
+
+    scope is the agent (see store.scope_of), so one agent never gets another
+    agent's answer. Bumping the generation (invalidate) retires every cached
+    answer of that agent at once; the old keys simply expire. Each worker keeps
+    a local copy of the vectors per agent, re-synced every AI_CACHE_SYNC_SECONDS,
+    so a lookup is one matrix product.
+    """
+
+    def __init__(self):
+        self.redis = redis_service.redis
+        self._sync_redis = None  # blocking client for invalidate_sync, opened on first use
+        # scope -> {"gen", "ids", "matrix", "synced_at"}
+        self._local: dict[str, dict] = {}
+        self.stats = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "errors": 0,
+            "lookup_seconds_total": 0.0,
+            "lookups": 0,
+        }
+
+    # ---------- helpers ----------
+    @staticmethod
+    def _prefix(agent_id) -> str:
+        from .store import scope_of  # imported late: store imports this module
+        return f"{PREFIX}:{scope_of(agent_id)}"
+
+    async def _generation(self, prefix: str) -> int:
+        return int(await self.redis.get(f"{prefix}:gen") or 0)
+
+    @staticmethod
+    def _embed(question: str) -> np.ndarray:
+        from .store import get_embeddings  # imported late: store imports this module
+        with metrics.stage("embed"):
+            vector = np.asarray(get_embeddings().embed_query(question), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    async def _sync_vectors(self, prefix: str, gen: int) -> dict:
+        """Refreshes the local vector copy of one agent when it is stale or the generation changed."""
+        local = self._local.get(prefix)
+        if local and local["gen"] == gen and time.monotonic() - local["synced_at"] < config.AI_CACHE_SYNC_SECONDS:
+            return local
+        raw = await self.redis.hgetall(f"{prefix}:{gen}:vectors")
+        local = self._local[prefix] = {
+            "gen": gen,
+            "ids": list(raw.keys()),
+            "matrix": np.stack([_decode_vector(v) for v in raw.values()]) if raw else np.zeros((0, 0), dtype=np.float32),
+            "synced_at": time.monotonic(),
+        }
+        return local
+
+    async def _read_entry(self, prefix: str, gen: int, key: str):
+        raw = await self.redis.get(f"{prefix}:{gen}:{key}")
+        if raw is None:
+            return None
+        await self.redis.zadd(f"{prefix}:{gen}:lru", {key: time.time()})
+        return json.loads(raw)["answer"]
+
+    # ---------- public api ----------
+    async def lookup(self, question: str, agent_id=None):
+        """
+        Returns (answer, embedding, generation). answer is None on a miss; pass the
+        embedding and the generation back to store(), so the question is not embedded
+        twice and an answer built before an ingest is not cached as current.
+        Only answers cached for the same agent are considered.
+        """
+        if not config.AI_CACHE_ENABLED:
+            metrics.CACHE_LOOKUPS.inc(result="disabled")
+            return None, None, None
+        started = time.perf_counter()
+        vector = gen = None
+        try:
+            prefix = self._prefix(agent_id)
+            gen = await self._generation(prefix)
+            key = hashlib.sha256(_normalize(question).encode()).hexdigest()
+
+            answer = await self._read_entry(prefix, gen, key)
+            if answer is not None:
+                self.stats["exact_hits"] += 1
+                metrics.CACHE_LOOKUPS.inc(result="exact_hit")
+                return answer, None, gen
+
+            vector = await run_in_threadpool(self._embed, question)
+            local = await self._sync_vectors(prefix, gen)
+            if len(local["ids"]):
+                scores = local["matrix"] @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= config.AI_CACHE_SIMILARITY:
+                    match = local["ids"][best]
+                    answer = await self._read_entry(prefix, gen, match)
+                    if answer is not None:
+                        self.stats["semantic_hits"] += 1
+                        metrics.CACHE_LOOKUPS.inc(result="semantic_hit")
+                        return answer, vector, gen
+                    # the answer expired; forget its vector too
+                    await self.redis.hdel(f"{prefix}:{gen}:vectors", match)
+                    await self.redis.zrem(f"{prefix}:{gen}:lru", match)
+            self.stats["misses"] += 1
+            metrics.CACHE_LOOKUPS.inc(result="miss")
+            return None, vector, gen
+        except Exception as e:
+            # the cache must never take the AI route down with it
+            self.stats["errors"] += 1
+            metrics.CACHE_LOOKUPS.inc(result="error")
+            logger.warning(f"[AI CACHE] lookup failed: {e}")
+            return None, vector, None  # generation unknown: the answer will not be cached
+        finally:
+            self.stats["lookups"] += 1
+            self.stats["lookup_seconds_total"] += time.perf_counter() - started
+            metrics.STAGE_SECONDS.observe(time.perf_counter() - started, stage="cache")
+
+    async def store(self, question: str, answer: str, vector=None, gen=None, agent_id=None):
+        """
+        Caches an answer for the agent and evicts its least recently used entries above the size limit.
+        gen is the generation lookup() saw before the answer was built; if the knowledge
+        changed since, the answer lands under a retired generation and is never served.
+        """
+        if not config.AI_CACHE_ENABLED or gen is None:
+            return
+        try:
+            prefix = self._prefix(agent_id)
+            key = hashlib.sha256(_normalize(question).encode()).hexdigest()
+            if vector is None:
+                vector = await run_in_threadpool(self._embed, question)
+            ttl = config.AI_CACHE_TTL_SECONDS
+            lru_key, vectors_key = f"{prefix}:{gen}:lru", f"{prefix}:{gen}:vectors"
+
+            pipe = self.redis.pipeline()
+            pipe.set(f"{prefix}:{gen}:{key}", json.dumps({"question": question, "answer": answer}), ex=ttl)
+            pipe.hset(vectors_key, key, _encode_vector(vector))
+            pipe.zadd(lru_key, {key: time.time()})
+            pipe.expire(vectors_key, ttl)
+            pipe.expire(lru_key, ttl)
+            pipe.zcard(lru_key)
+            size = (await pipe.execute())[-1]
+
+            overflow = size - config.AI_CACHE_MAX_ENTRIES
+            if overflow > 0:
+                evicted = [member for member, _ in await self.redis.zpopmin(lru_key, overflow)]
+                pipe = self.redis.pipeline()
+                pipe.delete(*[f"{prefix}:{gen}:{member}" for member in evicted])
+                pipe.hdel(vectors_key, *evicted)
+                await pipe.execute()
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"[AI CACHE] store failed: {e}")
+
+    async def invalidate(self, agent_id=None):
+        """Drops every cached answer of the agent (its knowledge base changed)."""
+        try:
+            await self.redis.incr(f"{self._prefix(agent_id)}:gen")
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"[AI CACHE] invalidate failed: {e}")
+
+    def invalidate_sync(self, agent_id=None):
+        """
+        Same as invalidate, for blocking code: the ingest pipeline runs in worker
+        threads (and scripts) without an event loop to await on.
+        """
+        try:
+            if self._sync_redis is None:
+                self._sync_redis = redis.Redis.from_url(Config.REDIS_URL, decode_responses=True)
+            self._sync_redis.incr(f"{self._prefix(agent_id)}:gen")
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"[AI CACHE] invalidate failed: {e}")
+
+    def snapshot(self) -> dict:
+        """Hit rate and latency numbers for monitoring."""
+        stats = dict(self.stats)
+        hits = stats["exact_hits"] + stats["semantic_hits"]
+        stats["hit_rate"] = hits / stats["lookups"] if stats["lookups"] else 0.0
+        stats["avg_lookup_ms"] = (
+            1000 * stats["lookup_seconds_total"] / stats["lookups"] if stats["lookups"] else 0.0
+        )
+        return stats
+
+
+answer_cache = SemanticAnswerCache()
@@ -1,26 +1,19 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
+import time
+import asyncio
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
-from langchain_groq import ChatGroq
-from . import config, store
-
-# initialise the llm(brain)
-llm = ChatGroq(
-    model="llama-3.3-70b-versatile", # flash is fast and free-tire eligible
-    api_key=config.GROQ_API_KEY, #type: ignore
-    temperature=0, #0 means "be factural, don't hallucinate",
-)
-
-# Set up the Retriever (the search engine)
-# search_kwargs={"k":3} means "fetch the top 3 most relevant chunks"
-retriever = store.get_vector_store().as_retriever(search_kwargs={"k":3}) #type: ignore
+from . import config, metrics, retrieval
+from .llm import get_llm
+from .cache import answer_cache
 
 # define the prompt template (the instructions)
 template = """
 You are a helpful AI assistant.
 Answer the user's question based ONLY on the context provided below.
 If the answer is not in the context, say "I don't have enough information to answer that."
+Use the conversation so far only to understand what the question refers to.
+
+Conversation so far:
+{history}
 
 Context:
 {context}
@@ -31,27 +24,147 @@ Question:
 
 prompt = ChatPromptTemplate.from_template(template)
 
-#creating the chain (the pipeline)
-# this uses LCEL(LangChain Expression Language)
 def format_docs(docs):
     return "\n\n".join(doc.page_content for doc in docs)
 
-rag_chain = (
-    {"context": retriever | format_docs, "question": RunnablePassthrough()}
-    | prompt
-    | llm
-    | StrOutputParser()
-)
+def build_messages(question: str, docs, history: str = ""):
+    return prompt.format_messages(
+        context=format_docs(docs), question=question, history=history or "(new conversation)"
+    )
+
+def _usage(stats: dict, message=None, cached: bool = False) -> dict:
+    """
+    Per-request token report: what retrieval put in the prompt and,
+    when the llm reports it, the prompt / completion tokens the provider billed.
+    """
+    usage = {"cached": cached, **stats}
+    # which model answered (a fallback may have taken over)
+    usage["model"] = (getattr(message, "response_metadata", None) or {}).get("model_name")
+    metadata = getattr(message, "usage_metadata", None) or {}
+    usage["prompt_tokens"] = metadata.get("input_tokens")
+    usage["completion_tokens"] = metadata.get("output_tokens")
+    usage["total_tokens"] = metadata.get("total_tokens")
+    return usage
+
+_CACHED_USAGE = {"candidates": 0, "context_chunks": 0, "context_tokens": 0}
+
+# limits how many questions run through the llm at the same time
+_ask_slots = asyncio.Semaphore(config.AI_MAX_CONCURRENT_ASKS)
 
-def ask_ai(question:str):
+_END_OF_STREAM = object()
+
+def ask_ai(question:str, agent_id=None):
     """
-    This is the main functio nthe fastapi will call
+    Blocking version, kept for scripts (see test_ingest.py).
+    Errors are raised, not returned as text.
 
     Args:
         question (str): _description_
+        agent_id: whose knowledge to search (None -> shared knowledge base)
+    """
+    docs, _ = retrieval.retrieve_context(question, agent_id=agent_id)
+    with metrics.stage("prompt"):
+        messages = build_messages(question, docs)
+    with metrics.stage("llm"):
+        return get_llm().invoke(messages).content
+
+async def ask_ai_async(question:str, agent_id=None, history: str = "") -> dict:
+    """
+    Non-blocking version of ask_ai for the fastapi routes.
+    Repeated (or nearly identical) questions are answered from the semantic cache.
+    Retrieval (hybrid search, MMR rerank, token budget) runs in a worker thread
+    and the Groq call is awaited natively, so a slow answer never freezes the
+    event loop for other requests. Every stage is timed (see metrics.py)
+    and errors are raised to the route.
+
+    Answers that depend on a conversation (history given) are not cached:
+    the same words can mean something else in another conversation.
+
+    Returns {"answer": ..., "usage": {...}}.
+
+    Args:
+        question (str): the user's question
+        agent_id: whose knowledge to search (None -> shared knowledge base)
+        history (str): earlier conversation (see memory.format_history)
+    """
+    started = time.perf_counter()
+    cached, vector, gen = (None, None, None) if history else await answer_cache.lookup(question, agent_id)
+    if cached is not None:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="ask")
+        return {"answer": cached, "usage": _usage(_CACHED_USAGE, cached=True)}
+
+    async with _ask_slots:
+        docs, stats = await retrieval.aretrieve_context(question, vector, agent_id)
+        with metrics.stage("prompt"):
+            messages = build_messages(question, docs, history)
+        with metrics.stage("llm"):
+            message = await get_llm().ainvoke(messages)
+    response = str(message.content)
+    if not history:
+        await answer_cache.store(question, response, vector, gen, agent_id)
+    usage = _usage(stats, message)
+    metrics.record_usage(usage)
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="ask")
+    return {"answer": response, "usage": usage}
+
+
+async def stream_ai(question:str, usage: dict | None = None, agent_id=None, history: str = ""):
     """
+    Streams the answer token by token as Groq produces it (llm.astream),
+    so the first words reach the user long before the full answer is ready.
+    If a `usage` dict is passed it is filled in once the stream is over.
+
+    Args:
+        question (str): the user's question
+        usage (dict): optional, receives the token report
+        agent_id: whose knowledge to search (None -> shared knowledge base)
+        history (str): earlier conversation (see memory.format_history)
+    """
+    started = time.perf_counter()
+    cached, vector, gen = (None, None, None) if history else await answer_cache.lookup(question, agent_id)
+    if cached is not None:
+        if usage is not None:
+            usage.update(_usage(_CACHED_USAGE, cached=True))
+        yield cached
+        return
+
+    # Generation runs in its own task and holds the slot only while the llm produces
+    # tokens; a client reading the stream slowly never keeps a slot busy.
+    chunks: asyncio.Queue = asyncio.Queue()
+    full = None
+    stats: dict = {}
+
+    async def generate():
+        nonlocal full, stats
+        try:
+            async with _ask_slots:
+                docs, stats = await retrieval.aretrieve_context(question, vector, agent_id)
+                with metrics.stage("prompt"):
+                    messages = build_messages(question, docs, history)
+                with metrics.stage("llm"):
+                    async for chunk in get_llm().astream(messages):
+                        if full is None:
+                            metrics.FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+                        full = chunk if full is None else full + chunk
+                        if chunk.content:
+                            chunks.put_nowait(chunk.content)
+            chunks.put_nowait(_END_OF_STREAM)
+        except Exception as e:
+            chunks.put_nowait(e)
+
+    producer = asyncio.create_task(generate())
     try:
-        response = rag_chain.invoke(question)
-        return response
-    except Exception as e:
-        return f"Error processing request: {str(e)}"
\ No newline at end of file
+        while (item := await chunks.get()) is not _END_OF_STREAM:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # the client went away (or the stream failed): stop generating and free the slot
+        producer.cancel()
+    report = _usage(stats, full)
+    metrics.record_usage(report)
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="ask_stream")
+    if usage is not None:
+        usage.update(report)
+    if not history:
+        await answer_cache.store(question, str(full.content) if full is not None else "", vector, gen, agent_id)
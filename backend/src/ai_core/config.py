@@ -5,8 +5,77 @@ from dotenv import load_dotenv
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY") # optional: enables the Gemini fallback
 
-VECTOR_DB_PATH = os.path.join(os.path.dirname(__file__), "chroma_db")
+# LLM gateway: primary Groq model, a smaller Groq model to fall over to, then
+# Gemini (when GOOGLE_API_KEY is set). "fake" answers locally (tests, benchmarks).
+AI_LLM_PROVIDER = os.getenv("AI_LLM_PROVIDER", "groq")
+AI_LLM_PRIMARY_MODEL = os.getenv("AI_LLM_PRIMARY_MODEL", "llama-3.3-70b-versatile")
+AI_LLM_FALLBACK_MODEL = os.getenv("AI_LLM_FALLBACK_MODEL", "llama-3.1-8b-instant") # "" = no fallback
+AI_LLM_GEMINI_MODEL = os.getenv("AI_LLM_GEMINI_MODEL", "gemini-2.0-flash")
+AI_LLM_FAKE_RESPONSE = os.getenv("AI_LLM_FAKE_RESPONSE", "This is a fake answer.")
+# a model slower than this (seconds) counts as failed and the next one is tried
+AI_LLM_TIMEOUT_SECONDS = float(os.getenv("AI_LLM_TIMEOUT_SECONDS", "20"))
+AI_LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("AI_LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+AI_LLM_MAX_ATTEMPTS = int(os.getenv("AI_LLM_MAX_ATTEMPTS", "2")) # per model, transient errors only
+AI_LLM_MAX_CONNECTIONS = int(os.getenv("AI_LLM_MAX_CONNECTIONS", "20"))
 
-if not GROQ_API_KEY:
-    raise ValueError("GOOGLE_API_KEY is missing from .env file")
\ No newline at end of file
+# data directories can be moved with env vars (e.g. a temp dir for benchmarks)
+VECTOR_DB_PATH = os.getenv("AI_VECTOR_DB_PATH") or os.path.join(os.path.dirname(__file__), "chroma_db")
+# embeddings already computed, keyed by a hash of the text (re-ingests skip the model)
+EMBEDDING_CACHE_PATH = os.getenv("AI_EMBEDDING_CACHE_PATH") or os.path.join(os.path.dirname(__file__), "embedding_cache")
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Vector backend: "chroma" (default) or "quantized" (int8 vectors + sign-bit codes
+# in memory-mapped files shared by all workers, see quantized_store.py).
+AI_VECTOR_BACKEND = os.getenv("AI_VECTOR_BACKEND", "chroma")
+QUANTIZED_INDEX_PATH = os.getenv("AI_QUANTIZED_INDEX_PATH") or os.path.join(os.path.dirname(__file__), "quantized_index")
+# rows re-scored per result after the sign-code pass: higher = better recall, slower (0 = re-score all)
+QUANTIZED_OVERSAMPLE = int(os.getenv("AI_QUANTIZED_OVERSAMPLE", "8"))
+# where the HuggingFace model files are kept (None = default HF cache)
+EMBEDDING_MODEL_CACHE_DIR = os.getenv("AI_EMBEDDING_MODEL_CACHE_DIR") or None
+# "1" = never hit the HuggingFace hub; the model must already be in the cache dir
+EMBEDDING_LOCAL_ONLY = os.getenv("AI_EMBEDDING_LOCAL_ONLY", "0") == "1"
+
+# Ingestion: long texts are split into overlapping chunks measured in model tokens
+# (MiniLM only reads the first 256 tokens, anything longer would be lost).
+CHUNK_TOKENS = int(os.getenv("AI_CHUNK_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("AI_CHUNK_OVERLAP_TOKENS", "30"))
+EMBED_BATCH_SIZE = int(os.getenv("AI_EMBED_BATCH_SIZE", "64"))
+EMBED_WORKERS = int(os.getenv("AI_EMBED_WORKERS", "2"))
+
+# Retrieval: dense (Chroma) and keyword (BM25) results are fused with
+# reciprocal rank fusion, then the top RETRIEVER_K chunks go into the prompt.
+KEYWORD_INDEX_PATH = os.getenv("AI_KEYWORD_INDEX_PATH") or os.path.join(os.path.dirname(__file__), "keyword_index")
+RETRIEVER_K = int(os.getenv("AI_RETRIEVER_K", "3"))
+DENSE_FETCH_K = int(os.getenv("AI_DENSE_FETCH_K", "10"))
+KEYWORD_FETCH_K = int(os.getenv("AI_KEYWORD_FETCH_K", "10"))
+RRF_K = int(os.getenv("AI_RRF_K", "60"))
+# Second stage: over-fetch candidates, rerank them with MMR (relevance vs.
+# redundancy) on their stored embeddings, then pack the best ones into a
+# fixed token budget so the prompt never grows without bound.
+RERANK_CANDIDATES = int(os.getenv("AI_RERANK_CANDIDATES", "12"))
+MMR_LAMBDA = float(os.getenv("AI_MMR_LAMBDA", "0.7"))  # 1.0 = pure relevance
+CONTEXT_TOKEN_BUDGET = int(os.getenv("AI_CONTEXT_TOKEN_BUDGET", "1200"))
+
+# Concurrency limits for the AI routes (per worker process).
+# Extra requests wait for a free slot instead of piling onto Groq / the embedder.
+AI_MAX_CONCURRENT_ASKS = int(os.getenv("AI_MAX_CONCURRENT_ASKS", "8"))
+AI_MAX_CONCURRENT_INGESTS = int(os.getenv("AI_MAX_CONCURRENT_INGESTS", "2"))
+
+# Conversation memory for /ai/ask with agent_id and a bearer token: the last AI_MEMORY_TURNS
+# messages go into the prompt as they are, older ones as a rolling summary.
+AI_MEMORY_TURNS = int(os.getenv("AI_MEMORY_TURNS", "6"))
+AI_MEMORY_SUMMARY_WORDS = int(os.getenv("AI_MEMORY_SUMMARY_WORDS", "120"))
+AI_MEMORY_TTL_SECONDS = int(os.getenv("AI_MEMORY_TTL_SECONDS", str(24 * 60 * 60)))
+
+# Semantic answer cache (Redis). Questions whose embedding is at least this
+# similar (cosine) to a cached question get the cached answer.
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "1") == "1"
+AI_CACHE_SIMILARITY = float(os.getenv("AI_CACHE_SIMILARITY", "0.92"))
+AI_CACHE_TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_SECONDS", "3600"))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "1000"))
+AI_CACHE_SYNC_SECONDS = int(os.getenv("AI_CACHE_SYNC_SECONDS", "5"))
+
+if not GROQ_API_KEY and AI_LLM_PROVIDER != "fake":
+    raise ValueError("GROQ_API_KEY is missing from .env file")
\ No newline at end of file
@@ -0,0 +1,59 @@
+import time
+import logging
+import threading
+from starlette.concurrency import run_in_threadpool
+from . import store
+from .llm import llm_gateway
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class AIEngine:
+    """
+    Owns the start-up of the AI engine: embedding model, vector store,
+    splitter, keyword index and chat model. Started once from the app lifespan so the
+    first user request doesn't pay for loading the models.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.error: str | None = None
+        self.startup_seconds: float | None = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Loads everything (safe to call from several threads; runs once)."""
+        with self._lock:
+            if self.ready:
+                return
+            started = time.perf_counter()
+            try:
+                db = store.get_vector_store()
+                store.get_splitter()
+                store.get_keyword_index()
+                llm_gateway.get()
+                # one dummy embedding loads the model weights into memory
+                db.embeddings.embed_query("warm up") # type: ignore
+            except Exception as e:
+                self.error = str(e)
+                logger.error(f"[AI ENGINE] start-up failed: {e}")
+                raise
+            self.error = None
+            self.startup_seconds = time.perf_counter() - started
+            self.ready = True
+            logger.info(f"[AI ENGINE] ready in {self.startup_seconds:.1f}s")
+
+    async def start_async(self):
+        """Same as start(), without blocking the event loop."""
+        await run_in_threadpool(self.start)
+
+    async def stop_async(self):
+        """Releases what the engine holds open (the LLM connection pool)."""
+        await llm_gateway.aclose()
+        self.ready = False
+
+    def status(self) -> dict:
+        return {"ready": self.ready, "error": self.error, "startup_seconds": self.startup_seconds}
+
+
+ai_engine = AIEngine()
@@ -0,0 +1,69 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+import anyio.from_thread
+from src.shared.services.redis_service import redis_service
+from . import store
+
+logger = logging.getLogger("uvicorn.error")
+
+PREFIX = "ai:ingest:job"
+JOB_TTL_SECONDS = 24 * 60 * 60  # keep finished job reports for a day
+
+# running jobs are referenced here so the event loop does not garbage-collect them
+_running: set[asyncio.Task] = set()
+
+
+async def _save(job: dict):
+    await redis_service.set_key(f"{PREFIX}:{job['job_id']}", json.dumps(job), expiry_seconds=JOB_TTL_SECONDS)
+
+
+async def get_job(job_id: str) -> dict | None:
+    """Returns the status of an ingest job, or None if it is unknown / expired."""
+    raw = await redis_service.get_key(f"{PREFIX}:{job_id}")
+    return json.loads(raw) if raw else None
+
+
+async def _run(job: dict, texts: list[str], agent_id=None):
+    def progress(done: int, total: int):
+        # called from the worker thread; hop back to the event loop to write the status
+        job.update(done=done, total=total)
+        anyio.from_thread.run(_save, job)
+
+    job["state"] = "running"
+    await _save(job)
+    try:
+        counts = await store.ingest_documents_async(texts, progress, agent_id)
+        job.update(state="completed", added=counts["added"], skipped=counts["skipped"])
+    except Exception as e:
+        logger.error(f"[INGEST JOB] {job['job_id']} failed: {e}")
+        job.update(state="failed", error=str(e))
+    job["finished_at"] = time.time()
+    await _save(job)
+
+
+async def start_job(texts: list[str], agent_id=None) -> dict:
+    """
+    Starts ingesting (into the agent's knowledge base) in the background and returns immediately.
+    Progress (chunks done / total) is kept in Redis so any worker can report it.
+    """
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "agent_id": str(agent_id) if agent_id else None,
+        "state": "queued",
+        "documents": len(texts),
+        "total": None,
+        "done": 0,
+        "added": None,
+        "skipped": None,
+        "error": None,
+        "created_at": time.time(),
+        "finished_at": None,
+    }
+    await _save(job)
+    task = asyncio.create_task(_run(job, texts, agent_id))
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    return job
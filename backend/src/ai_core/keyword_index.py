@@ -0,0 +1,307 @@
+import os
+import re
+import json
+import math
+import fcntl
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it of on or that the this to was what when "
+    "where which who why will with you your".split()
+)
+
+# BM25 parameters (standard values)
+K1 = 1.2
+B = 0.75
+
+# the newest segment is merged into the one before it while that one is at most
+# MERGE_RATIO times bigger, so there are only about log4(documents / upload size) segments
+MERGE_RATIO = 4
+_OPEN_ATTEMPTS = 5  # manifest re-reads when a merge retires segments while we open them
+
+_SEGMENT_FILES = ("doc_ids", "doc_len", "terms", "offsets", "post_doc", "post_tf")
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def term_hash(term: str) -> int:
+    """64-bit id of a term; the vocabulary is stored as sorted hashes, not strings."""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _pack(doc_ids, doc_len, post_term, post_doc, post_tf) -> dict:
+    """
+    Segment arrays from flat postings (post_doc = position in doc_ids).
+    Documents are sorted by id (membership is a binary search) and postings by term.
+    """
+    order = np.argsort(doc_ids, kind="stable")
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    by_term = np.argsort(post_term, kind="stable")
+    post_term = post_term[by_term]
+    terms, starts = np.unique(post_term, return_index=True)
+    return {
+        "doc_ids": doc_ids[order],
+        "doc_len": doc_len[order].astype(np.int32),
+        "terms": terms.astype(np.uint64),
+        "offsets": np.append(starts, len(post_term)).astype(np.int64),
+        "post_doc": rank[post_doc[by_term]].astype(np.int32),
+        "post_tf": post_tf[by_term].astype(np.uint16),
+    }
+
+
+class _Segment:
+    """One immutable, memory-mapped piece of the index."""
+
+    def __init__(self, path: str):
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in _SEGMENT_FILES}
+        self.doc_ids = arrays["doc_ids"]    # sorted vector store ids (fixed width bytes)
+        self.doc_len = arrays["doc_len"]    # token count of each document
+        self.terms = arrays["terms"]        # sorted term hashes
+        self.offsets = arrays["offsets"]    # postings of terms[i] are offsets[i]:offsets[i + 1]
+        self.post_doc = arrays["post_doc"]  # document numbers, all terms back to back
+        self.post_tf = arrays["post_tf"]    # term frequency for each posting
+
+    def postings(self, term: int):
+        """(documents, term frequencies) of a term hash, or None."""
+        i = int(np.searchsorted(self.terms, np.uint64(term)))
+        if i == len(self.terms) or int(self.terms[i]) != term:
+            return None
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return np.asarray(self.post_doc[start:end]), np.asarray(self.post_tf[start:end], dtype=np.float32)
+
+    def contains(self, ids: np.ndarray) -> np.ndarray:
+        """Which of the ids (S64) this segment holds."""
+        if not len(self.doc_ids):
+            return np.zeros(len(ids), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.doc_ids, ids), len(self.doc_ids) - 1)
+        return np.asarray(self.doc_ids[positions]) == ids
+
+
+class _Snapshot:
+    """The segments of one manifest version; searches never see a half-swapped index."""
+
+    def __init__(self, key, entries: list[dict], segments: list[_Segment]):
+        self.key = key
+        self.segments = segments
+        self.bases = np.cumsum([0] + [entry["docs"] for entry in entries])  # first global number per segment
+        self.n_docs = int(self.bases[-1])
+        self.avg_len = sum(entry["tokens"] for entry in entries) / max(self.n_docs, 1)
+
+
+class KeywordIndex:
+    """
+    BM25 inverted index stored as append-only, memory-mapped segments.
+
+    Files (in `path`):
+        manifest.json      -> the live segments: [{"name", "docs", "tokens"}], plus the next segment number
+        write.lock         -> held by the process that is adding or merging
+        seg-NNNNNN/        -> one segment (see _Segment), never modified once written
+
+    Adding documents tokenizes only the new ones and writes them as a new
+    segment; small segments are merged into bigger ones as they pile up, so an
+    upload costs about its own size instead of a rewrite of the whole index.
+    Writers hold a file lock, so uvicorn workers can't overwrite each other.
+    The manifest is swapped in atomically after the segments are in place;
+    readers re-map only when it changed, and every search works on one
+    snapshot of the segments.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()  # guards re-mapping in this process
+        self._open_segments: dict[str, _Segment] = {}
+        self._snapshot = _Snapshot(None, [], [])
+
+    # ---------- loading ----------
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _manifest_key(self):
+        try:
+            st = os.stat(self._file("manifest.json"))
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self._file("manifest.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"next": 0, "segments": []}
+
+    def _segment(self, name: str) -> _Segment:
+        segment = self._open_segments.get(name)
+        if segment is None:
+            segment = self._open_segments[name] = _Segment(self._file(name))
+        return segment
+
+    def _current(self) -> _Snapshot:
+        """Segments to search; re-mapped only when another process or thread changed the manifest."""
+        snapshot = self._snapshot
+        if self._manifest_key() == snapshot.key:
+            return snapshot
+        with self._lock:
+            for _ in range(_OPEN_ATTEMPTS):
+                key = self._manifest_key()
+                if key == self._snapshot.key:
+                    return self._snapshot
+                entries = self._read_manifest()["segments"]
+                try:
+                    segments = [self._segment(entry["name"]) for entry in entries]
+                except FileNotFoundError:
+                    continue  # a merge retired a segment in between; read the new manifest
+                names = {entry["name"] for entry in entries}
+                self._open_segments = {name: seg for name, seg in self._open_segments.items() if name in names}
+                self._snapshot = _Snapshot(key, entries, segments)
+                return self._snapshot
+        raise RuntimeError(f"Keyword index at {self.path} keeps changing or lists missing segments")
+
+    def __len__(self):
+        return self._current().n_docs
+
+    # ---------- writing ----------
+    @contextmanager
+    def _write_lock(self):
+        """Exclusive across threads and worker processes."""
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file("write.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _write_segment(self, name: str, arrays: dict):
+        # written under a temporary name, then renamed: a segment directory is always complete
+        tmp = self._file(f"{name}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)  # leftovers of a crashed writer
+        os.makedirs(tmp)
+        for array_name, array in arrays.items():
+            np.save(os.path.join(tmp, f"{array_name}.npy"), array)
+        os.replace(tmp, self._file(name))
+
+    def _write_manifest(self, manifest: dict):
+        tmp = self._file("manifest.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self._file("manifest.json"))
+
+    @staticmethod
+    def _build(documents: list[tuple[bytes, str]]) -> tuple[dict, int]:
+        """Segment arrays and total token count for (id, text) pairs."""
+        hashes: dict[str, int] = {}
+        post_term, post_doc, post_tf, lengths = [], [], [], []
+        for position, (_, text) in enumerate(documents):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            counts: dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for term, tf in counts.items():
+                if term not in hashes:
+                    hashes[term] = term_hash(term)
+                post_term.append(hashes[term])
+                post_doc.append(position)
+                post_tf.append(min(tf, 65535))
+        arrays = _pack(
+            np.array([doc_id for doc_id, _ in documents], dtype="S64"),
+            np.array(lengths, dtype=np.int32),
+            np.array(post_term, dtype=np.uint64),
+            np.array(post_doc, dtype=np.int64),
+            np.array(post_tf, dtype=np.uint16),
+        )
+        return arrays, sum(lengths)
+
+    @staticmethod
+    def _merge(segments: list[_Segment]) -> dict:
+        """One segment holding the documents of all the given ones."""
+        post_term, post_doc, base = [], [], 0
+        for segment in segments:
+            post_term.append(np.repeat(np.asarray(segment.terms), np.diff(segment.offsets)))
+            post_doc.append(np.asarray(segment.post_doc, dtype=np.int64) + base)
+            base += len(segment.doc_ids)
+        return _pack(
+            np.concatenate([segment.doc_ids for segment in segments]),
+            np.concatenate([segment.doc_len for segment in segments]),
+            np.concatenate(post_term),
+            np.concatenate(post_doc),
+            np.concatenate([segment.post_tf for segment in segments]),
+        )
+
+    def add(self, documents: list[tuple[str, str]]):
+        """Indexes (id, text) pairs as a new segment. Ids the index already holds are skipped."""
+        if not documents:
+            return
+        with self._write_lock():
+            snapshot = self._current()  # nobody else writes while we hold the lock
+            manifest = self._read_manifest()
+
+            unique = dict((doc_id.encode(), text) for doc_id, text in documents)
+            ids = np.array(list(unique), dtype="S64")
+            known = np.zeros(len(ids), dtype=bool)
+            for segment in snapshot.segments:
+                known |= segment.contains(ids)
+            new = [(doc_id, unique[doc_id]) for doc_id in ids[~known].tolist()]
+            if not new:
+                return
+
+            arrays, tokens = self._build(new)
+            name = f"seg-{manifest['next']:06d}"
+            manifest["next"] += 1
+            self._write_segment(name, arrays)
+            entries = manifest["segments"]
+            entries.append({"name": name, "docs": len(new), "tokens": tokens})
+
+            retired = []
+            while len(entries) >= 2 and entries[-2]["docs"] <= MERGE_RATIO * entries[-1]["docs"]:
+                older, newer = entries[-2], entries[-1]
+                name = f"seg-{manifest['next']:06d}"
+                manifest["next"] += 1
+                self._write_segment(name, self._merge([_Segment(self._file(older["name"])), _Segment(self._file(newer["name"]))]))
+                entries[-2:] = [{"name": name, "docs": older["docs"] + newer["docs"], "tokens": older["tokens"] + newer["tokens"]}]
+                retired += [older["name"], newer["name"]]
+
+            self._write_manifest(manifest)
+            # readers that still map a retired segment keep their pages until they re-map
+            for name in retired:
+                shutil.rmtree(self._file(name), ignore_errors=True)
+
+    # ---------- searching ----------
+    def search(self, query: str, k: int) -> list[tuple[str, float]]:
+        """Top-k (id, bm25 score) for the query."""
+        snapshot = self._current()
+        if not snapshot.n_docs:
+            return []
+        scores = np.zeros(snapshot.n_docs, dtype=np.float32)
+        for term in {term_hash(term) for term in tokenize(query)}:
+            found = []
+            for base, segment in zip(snapshot.bases, snapshot.segments):
+                postings = segment.postings(term)
+                if postings is not None:
+                    found.append((int(base), segment, *postings))
+            df = sum(len(docs) for _, _, docs, _ in found)
+            if not df:
+                continue
+            idf = math.log(1 + (snapshot.n_docs - df + 0.5) / (df + 0.5))
+            for base, segment, docs, tf in found:
+                norm = K1 * (1 - B + B * np.asarray(segment.doc_len[docs]) / (snapshot.avg_len or 1.0))
+                scores[base + docs] += idf * tf * (K1 + 1) / (tf + norm)
+
+        hits = np.flatnonzero(scores)
+        if not len(hits):
+            return []
+        top = hits[np.argsort(-scores[hits])[:k]]
+        owners = np.searchsorted(snapshot.bases, top, side="right") - 1
+        return [
+            (snapshot.segments[owner].doc_ids[i - snapshot.bases[owner]].decode(), float(scores[i]))
+            for i, owner in zip(top, owners)
+        ]
@@ -0,0 +1,138 @@
+import logging
+import threading
+import httpx
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_groq import ChatGroq
+from . import config
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class LLMGateway:
+    """
+    One place that decides which chat model answers a question.
+
+    - Groq requests go through persistent httpx clients (kept-alive connection
+      pool shared by every request) with connect / read timeouts.
+    - Transient errors are retried: failed connects by the httpx transport,
+      5xx answers with exponential backoff and jitter. Read timeouts are not:
+      a model that was too slow once will be too slow again, so they fail over right away.
+    - If the primary model still fails (rate limited, slower than
+      AI_LLM_TIMEOUT_SECONDS, down) the request falls over to the smaller Groq
+      model and then to Gemini when GOOGLE_API_KEY is set.
+    - AI_LLM_PROVIDER=fake swaps everything for a local fake model (tests, benchmarks).
+    """
+
+    def __init__(self):
+        self._model = None
+        self._small_model = None
+        self._lock = threading.Lock()
+        self._http_client: httpx.Client | None = None
+        self._http_async_client: httpx.AsyncClient | None = None
+
+    # ---------- building ----------
+    def _timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(config.AI_LLM_TIMEOUT_SECONDS, connect=config.AI_LLM_CONNECT_TIMEOUT_SECONDS)
+
+    def _open_clients(self):
+        limits = httpx.Limits(
+            max_connections=config.AI_LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=config.AI_LLM_MAX_CONNECTIONS,
+        )
+        # the transport retries connection attempts only (refused / reset / connect timeout),
+        # never a request that was already sent
+        retries = config.AI_LLM_MAX_ATTEMPTS - 1
+        self._http_client = httpx.Client(
+            transport=httpx.HTTPTransport(limits=limits, retries=retries), timeout=self._timeout()
+        )
+        self._http_async_client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(limits=limits, retries=retries), timeout=self._timeout()
+        )
+
+    def _groq(self, model: str):
+        return ChatGroq(
+            model=model,
+            api_key=config.GROQ_API_KEY, #type: ignore
+            temperature=0, #0 means "be factural, don't hallucinate",
+            timeout=config.AI_LLM_TIMEOUT_SECONDS,
+            max_retries=0, # retries are done below, so rate limits fail over right away
+            http_client=self._http_client,
+            http_async_client=self._http_async_client,
+        )
+
+    def _gemini(self):
+        # imported lazily: only needed when the Gemini fallback is configured
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(
+            model=config.AI_LLM_GEMINI_MODEL,
+            google_api_key=config.GOOGLE_API_KEY,
+            temperature=0,
+            timeout=config.AI_LLM_TIMEOUT_SECONDS,
+            max_retries=0,
+        )
+
+    def _with_retry(self, model):
+        import groq
+        return model.with_retry(
+            retry_if_exception_type=(groq.InternalServerError,),  # 5xx only; 429 and timeouts fail over
+            wait_exponential_jitter=True,
+            stop_after_attempt=config.AI_LLM_MAX_ATTEMPTS,
+        )
+
+    def _build(self):
+        if config.AI_LLM_PROVIDER == "fake":
+            logger.info("[LLM] using the fake provider")
+            return FakeListChatModel(responses=[config.AI_LLM_FAKE_RESPONSE])
+
+        if self._http_async_client is None:
+            self._open_clients()
+        primary = self._with_retry(self._groq(config.AI_LLM_PRIMARY_MODEL))
+        fallbacks = []
+        if config.AI_LLM_FALLBACK_MODEL:
+            fallbacks.append(self._with_retry(self._groq(config.AI_LLM_FALLBACK_MODEL)))
+        if config.GOOGLE_API_KEY:
+            fallbacks.append(self._gemini())
+        return primary.with_fallbacks(fallbacks) if fallbacks else primary
+
+    def _build_small(self):
+        if config.AI_LLM_PROVIDER == "fake":
+            return FakeListChatModel(responses=[config.AI_LLM_FAKE_RESPONSE])
+        if self._http_async_client is None:
+            self._open_clients()
+        model = self._with_retry(self._groq(config.AI_LLM_FALLBACK_MODEL or config.AI_LLM_PRIMARY_MODEL))
+        return model.with_fallbacks([self._gemini()]) if config.GOOGLE_API_KEY else model
+
+    # ---------- public api ----------
+    def get(self):
+        """The chat model (with retries and fallbacks), built once (thread-safe)."""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._build()
+        return self._model
+
+    def get_small(self):
+        """A cheaper, faster model for background work (conversation summaries)."""
+        if self._small_model is None:
+            with self._lock:
+                if self._small_model is None:
+                    self._small_model = self._build_small()
+        return self._small_model
+
+    async def aclose(self):
+        """Closes the pooled connections (app shutdown)."""
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+        if self._http_client is not None:
+            self._http_client.close()
+        self._model = self._small_model = self._http_client = self._http_async_client = None
+
+
+llm_gateway = LLMGateway()
+
+
+def get_llm():
+    """
+    Singleton Accessor for the chat model.
+    """
+    return llm_gateway.get()
@@ -0,0 +1,165 @@
+import json
+import asyncio
+import logging
+from uuid import UUID
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+from src.shared.services.db_service import DatabaseService
+from src.shared.services.redis_service import redis_service
+from src.objects.messages.model import Message
+from . import config
+from .llm import llm_gateway
+
+logger = logging.getLogger("uvicorn.error")
+
+PREFIX = "ai:memory"
+USER, AGENT = "user", "agent"  # Message.sender values
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and an AI assistant.
+Keep names, facts and open questions; drop small talk. Answer with the new summary only, at most {words} words.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+"""
+
+# running summaries are referenced here so the event loop does not garbage-collect them
+_running: set[asyncio.Task] = set()
+
+
+class ConversationMemory:
+    """
+    Short-term memory of a user <-> agent conversation for /ai/ask.
+
+    Redis layout (per thread, refreshed with every turn):
+        ai:memory:{user}:{agent}:turns     -> list of the last AI_MEMORY_TURNS messages
+        ai:memory:{user}:{agent}:summary   -> rolling summary of everything older
+        ai:memory:{user}:{agent}:pending   -> messages waiting to be folded into the summary
+        ai:memory:{user}:{agent}:lock      -> held while the summary is being rewritten
+
+    A turn reads the history from Redis only. The Message table is read once,
+    when a thread is not cached yet (one query on the user/agent/created_at index).
+    Messages that fall out of the window are summarized by the small model in
+    the background, so the prompt stays bounded and the answer never waits for it.
+    """
+
+    def __init__(self):
+        self.redis = redis_service.redis
+
+    @staticmethod
+    def _key(user_id: UUID, agent_id: UUID, part: str) -> str:
+        return f"{PREFIX}:{user_id}:{agent_id}:{part}"
+
+    async def _load_from_db(self, db: DatabaseService, user_id: UUID, agent_id: UUID) -> list[dict]:
+        """Last AI_MEMORY_TURNS messages of the thread, oldest first (one indexed query)."""
+        stmt = (
+            select(Message.sender, Message.content)
+            .where(Message.user_id == user_id, Message.agent_id == agent_id, Message.content.is_not(None))
+            .order_by(Message.created_at.desc())
+            .limit(config.AI_MEMORY_TURNS)
+        )
+        rows = (await db.session.execute(stmt)).all()
+        return [{"role": sender, "content": content} for sender, content in reversed(rows)]
+
+    async def load(self, db: DatabaseService, user_id: UUID, agent_id: UUID) -> tuple[str, list[dict]]:
+        """Returns (summary, recent messages) for the thread."""
+        turns_key = self._key(user_id, agent_id, "turns")
+        pipe = self.redis.pipeline()
+        pipe.exists(turns_key)
+        pipe.lrange(turns_key, 0, -1)
+        pipe.get(self._key(user_id, agent_id, "summary"))
+        cached, raw_turns, summary = await pipe.execute()
+        if cached:
+            return summary or "", [json.loads(turn) for turn in raw_turns]
+
+        turns = await self._load_from_db(db, user_id, agent_id)
+        if turns:
+            pipe = self.redis.pipeline()
+            pipe.delete(turns_key)
+            pipe.rpush(turns_key, *[json.dumps(turn) for turn in turns])
+            pipe.expire(turns_key, config.AI_MEMORY_TTL_SECONDS)
+            await pipe.execute()
+        return summary or "", turns
+
+    async def remember(self, db: DatabaseService, user_id: UUID, agent_id: UUID, question: str, answer: str):
+        """
+        Saves the question and answer as Message rows (one commit) and slides the
+        cached window; whatever falls out of it is queued for the summary.
+        """
+        # server_default now() is the transaction start, the same for both rows;
+        # explicit increasing timestamps keep the answer after its question in _load_from_db
+        asked_at = datetime.now(timezone.utc)
+        db.session.add_all([
+            Message(user_id=user_id, agent_id=agent_id, sender=USER, content=question, created_at=asked_at),
+            Message(user_id=user_id, agent_id=agent_id, sender=AGENT, content=answer,
+                    created_at=asked_at + timedelta(microseconds=1)),
+        ])
+        await db.session.commit()
+
+        turns_key = self._key(user_id, agent_id, "turns")
+        ttl = config.AI_MEMORY_TTL_SECONDS
+        pipe = self.redis.pipeline()
+        pipe.rpush(turns_key, json.dumps({"role": USER, "content": question}), json.dumps({"role": AGENT, "content": answer}))
+        pipe.expire(turns_key, ttl)
+        size = (await pipe.execute())[0]
+
+        overflow = size - config.AI_MEMORY_TURNS
+        if overflow > 0:
+            dropped = await self.redis.lpop(turns_key, overflow)
+            if dropped:
+                pending_key = self._key(user_id, agent_id, "pending")
+                pipe = self.redis.pipeline()
+                pipe.rpush(pending_key, *dropped)
+                pipe.expire(pending_key, ttl)
+                await pipe.execute()
+                task = asyncio.create_task(self._summarize(user_id, agent_id))
+                _running.add(task)
+                task.add_done_callback(_running.discard)
+
+    async def _summarize(self, user_id: UUID, agent_id: UUID):
+        """Folds the pending messages into the summary (one summarizer per thread at a time)."""
+        lock_key = self._key(user_id, agent_id, "lock")
+        pending_key = self._key(user_id, agent_id, "pending")
+        summary_key = self._key(user_id, agent_id, "summary")
+        if not await self.redis.set(lock_key, "1", nx=True, ex=120):
+            return  # the running summarizer will pick the new messages up
+        try:
+            while True:
+                pending = await self.redis.lrange(pending_key, 0, -1)
+                if not pending:
+                    break
+                summary = await self.redis.get(summary_key) or ""
+                prompt = SUMMARY_PROMPT.format(
+                    words=config.AI_MEMORY_SUMMARY_WORDS,
+                    summary=summary or "(empty)",
+                    messages=format_turns([json.loads(turn) for turn in pending]),
+                )
+                message = await llm_gateway.get_small().ainvoke(prompt)
+                pipe = self.redis.pipeline()
+                pipe.set(summary_key, str(message.content).strip(), ex=config.AI_MEMORY_TTL_SECONDS)
+                pipe.ltrim(pending_key, len(pending), -1)
+                await pipe.execute()
+        except Exception as e:
+            # the conversation still works without a summary; the messages stay pending
+            logger.warning(f"[AI MEMORY] summary failed for {user_id}/{agent_id}: {e}")
+        finally:
+            await self.redis.delete(lock_key)
+
+
+def format_turns(turns: list[dict]) -> str:
+    return "\n".join(f"{'User' if turn['role'] == USER else 'Assistant'}: {turn['content']}" for turn in turns)
+
+
+def format_history(summary: str, turns: list[dict]) -> str:
+    """History block for the prompt ("" when the conversation is new)."""
+    parts = []
+    if summary:
+        parts.append(f"Summary of earlier conversation: {summary}")
+    if turns:
+        parts.append(format_turns(turns))
+    return "\n".join(parts)
+
+
+conversation_memory = ConversationMemory()
@@ -0,0 +1,147 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Small Prometheus exporter for the AI engine (text exposition format 0.0.4).
+# Values live in this worker process; scrape every worker (or run one) to see them all.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds: from a warm cache lookup (ms) up to a slow LLM answer (tens of seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 12, 20)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000)
+
+REGISTRY: list["_Metric"] = []
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self._samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: tuple = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket..., +Inf count, sum]
+        self._values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += 1
+            row[-1] += value
+
+    def totals(self) -> dict[tuple, tuple[int, float]]:
+        """(count, sum) per label set."""
+        with self._lock:
+            return {key: (int(row[-2]), row[-1]) for key, row in self._values.items()}
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = {key: list(row) for key, row in self._values.items()}
+        lines = []
+        for key, row in values.items():
+            for bound, count in zip(self.buckets, row):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {row[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {row[-2]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {row[-1]}")
+        return lines
+
+
+# ========================
+# AI engine metrics
+# ========================
+STAGE_SECONDS = Histogram(
+    "ai_rag_stage_seconds", "Time spent in each RAG stage (embed, cache, retrieve, prompt, llm).", ("stage",)
+)
+STAGE_ERRORS = Counter("ai_rag_stage_errors_total", "RAG stages that raised an exception.", ("stage",))
+REQUEST_SECONDS = Histogram("ai_rag_request_seconds", "End to end time of a question.", ("endpoint",))
+FIRST_TOKEN_SECONDS = Histogram("ai_rag_first_token_seconds", "Time until the first streamed token.")
+CACHE_LOOKUPS = Counter("ai_answer_cache_lookups_total", "Semantic answer cache lookups by result.", ("result",))
+DOCS_RETRIEVED = Histogram(
+    "ai_rag_docs_retrieved", "Chunks put into the prompt per question.", buckets=COUNT_BUCKETS
+)
+CONTEXT_TOKENS = Histogram("ai_rag_context_tokens", "Context tokens put into the prompt.", buckets=TOKEN_BUCKETS)
+LLM_TOKENS = Counter("ai_llm_tokens_total", "Tokens billed by the LLM provider.", ("model", "kind"))
+
+
+@contextmanager
+def stage(name: str):
+    """Times a block as one RAG stage; failures are counted and re-raised."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+
+
+def record_usage(usage: dict):
+    """Feeds the per-request usage report (see chat._usage) into the counters."""
+    if usage.get("cached"):
+        return
+    DOCS_RETRIEVED.observe(usage.get("context_chunks") or 0)
+    CONTEXT_TOKENS.observe(usage.get("context_tokens") or 0)
+    model = usage.get("model") or "unknown"
+    for kind in ("prompt", "completion"):
+        if usage.get(f"{kind}_tokens") is not None:
+            LLM_TOKENS.inc(usage[f"{kind}_tokens"], model=model, kind=kind)
+
+
+def render() -> str:
+    """Every metric in the Prometheus text format."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
@@ -0,0 +1,334 @@
+import os
+import json
+import uuid
+import fcntl
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterable, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+# number of set bits in every byte value, for hamming distances on packed sign codes
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_SCAN_BLOCK = 65536  # rows per hamming block (bounds the temporary arrays)
+
+
+def hamming(codes: np.ndarray, query_code: np.ndarray) -> np.ndarray:
+    """Bits that differ between every packed code row and the query code."""
+    if hasattr(np, "bitwise_count") and codes.shape[1] % 8 == 0:
+        # numpy >= 2: hardware popcount on 64-bit words
+        words = np.ascontiguousarray(codes).view(np.uint64) ^ query_code.view(np.uint64)
+        return np.bitwise_count(words).sum(axis=1, dtype=np.uint16)
+    return _POPCOUNT[codes ^ query_code].sum(axis=1, dtype=np.uint16)
+
+
+def quantize(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Normalizes the vectors and returns (int8 vectors, float32 scales, packed sign bits).
+    vector ~= int8 * scale; the sign bits (1 bit per dimension) drive the first search pass.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32), np.packbits(vectors > 0, axis=1)
+
+
+class QuantizedVectorStore(VectorStore):
+    """
+    Vector store for large corpora with a small, shared memory footprint.
+
+    Files (in `path`):
+        vectors.i8     -> int8 vectors, one row per chunk (4x smaller than float32)
+        scales.f32     -> one float per row to de-quantize it
+        codes.u8       -> sign bit of every dimension, packed (32x smaller)
+        docs.sqlite    -> row number, id, text and metadata of every chunk
+
+    The binary files are append-only and memory-mapped read-only, so every
+    uvicorn worker shares the same pages from the OS cache instead of holding
+    its own copy. A search ranks all rows by hamming distance on the sign
+    codes, then re-scores the best k * oversample rows with the int8 vectors:
+    a higher oversample gives better recall for a little more latency.
+
+    Writers take a file lock, append the rows, then commit them to SQLite;
+    readers only see rows that are committed.
+    """
+
+    def __init__(self, path: str, embedding: Embeddings, oversample: int = 8):
+        self.path = path
+        self._embedding = embedding
+        self.oversample = oversample
+        self._local = threading.local()  # one sqlite connection per thread
+        self._maps: dict[str, np.memmap] = {}
+        self._mapped_rows = 0
+        self._maps_lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS docs ("
+                "row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    # ---------- storage ----------
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self._file("docs.sqlite"), timeout=30)
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        conn = self._conn()
+        with conn:  # commits (or rolls back) the transaction
+            yield conn
+
+    @contextmanager
+    def _write_lock(self):
+        """Exclusive across threads and worker processes."""
+        with open(self._file("write.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _dim(self) -> Optional[int]:
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        return int(row[0]) if row else None
+
+    def _rows(self) -> int:
+        # rows are numbered 0..n-1 and only ever appended, so the last one gives the count;
+        # MAX on the primary key is a single b-tree lookup, COUNT(*) would scan the table
+        return self._conn().execute("SELECT COALESCE(MAX(row) + 1, 0) FROM docs").fetchone()[0]
+
+    def _mapped(self, rows: int) -> dict[str, np.memmap]:
+        """Read-only maps covering at least `rows` rows (re-mapped when the files grew)."""
+        with self._maps_lock:
+            if rows > self._mapped_rows or not self._maps:
+                dim = self._dim() or 0
+                self._maps = {
+                    "vectors": np.memmap(self._file("vectors.i8"), dtype=np.int8, mode="r", shape=(rows, dim)),
+                    "scales": np.memmap(self._file("scales.f32"), dtype=np.float32, mode="r", shape=(rows,)),
+                    "codes": np.memmap(self._file("codes.u8"), dtype=np.uint8, mode="r", shape=(rows, (dim + 7) // 8)),
+                }
+                self._mapped_rows = rows
+            return self._maps
+
+    @staticmethod
+    def _append(path: str, start: int, array: np.ndarray):
+        # write at the row offset (not at the end of file) so leftovers of a crashed write are overwritten
+        row_bytes = array.itemsize * (array.shape[1] if array.ndim > 1 else 1)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.pwrite(fd, np.ascontiguousarray(array).tobytes(), start * row_bytes)
+        finally:
+            os.close(fd)
+
+    # ---------- writing ----------
+    def add_embeddings(
+        self,
+        texts: list[str],
+        embeddings: list[list[float]],
+        metadatas: Optional[list[dict]] = None,
+        ids: Optional[list[str]] = None,
+    ) -> list[str]:
+        """Appends pre-computed vectors. Ids already stored are skipped."""
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        vectors, scales, codes = quantize(np.asarray(embeddings, dtype=np.float32))
+
+        with self._write_lock(), self._connection() as conn:
+            seen = self._known_ids(ids)
+            keep = []
+            for i, doc_id in enumerate(ids):
+                if doc_id not in seen:
+                    seen.add(doc_id)
+                    keep.append(i)
+            if not keep:
+                return []
+            dim = self._dim()
+            if dim is None:
+                conn.execute("INSERT INTO meta VALUES ('dim', ?)", (str(vectors.shape[1]),))
+            elif dim != vectors.shape[1]:
+                raise ValueError(f"Vectors have {vectors.shape[1]} dimensions, the index has {dim}")
+
+            start = self._rows()
+            self._append(self._file("vectors.i8"), start, vectors[keep])
+            self._append(self._file("scales.f32"), start, scales[keep])
+            self._append(self._file("codes.u8"), start, codes[keep])
+            conn.executemany(
+                "INSERT INTO docs (row, id, text, metadata) VALUES (?, ?, ?, ?)",
+                [(start + n, ids[i], texts[i], json.dumps(metadatas[i])) for n, i in enumerate(keep)],
+            )
+        return [ids[i] for i in keep]
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[list[dict]] = None,
+        *,
+        ids: Optional[list[str]] = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_embeddings(texts, self._embedding.embed_documents(texts), metadatas, ids)
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: Optional[list[dict]] = None,
+        *,
+        ids: Optional[list[str]] = None,
+        path: str = "quantized_index",
+        **kwargs: Any,
+    ) -> "QuantizedVectorStore":
+        store = cls(path, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+    # ---------- reading ----------
+    def _known_ids(self, ids: list[str]) -> set[str]:
+        found = set()
+        for start in range(0, len(ids), 500):
+            page = ids[start:start + 500]
+            marks = ",".join("?" * len(page))
+            found.update(r[0] for r in self._conn().execute(f"SELECT id FROM docs WHERE id IN ({marks})", page))
+        return found
+
+    def _allowed_rows(self, filter: Optional[dict]) -> Optional[np.ndarray]:
+        """Row numbers matching an equality filter ({"key": value, ...}); None = no filter."""
+        if not filter:
+            return None
+        clauses, params = [], []
+        for key, value in filter.items():
+            if isinstance(value, dict):
+                raise ValueError("Only equality filters ({'key': value}) are supported")
+            clauses.append("json_extract(metadata, ?) = ?")
+            params += [f"$.{key}", value]
+        sql = "SELECT row FROM docs WHERE " + " AND ".join(clauses)
+        return np.fromiter((r[0] for r in self._conn().execute(sql, params)), dtype=np.int64)
+
+    def _search(self, vector: list[float], k: int, filter: Optional[dict] = None) -> list[tuple[int, float]]:
+        rows = self._rows()
+        if not rows:
+            return []
+        maps = self._mapped(rows)
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        allowed = self._allowed_rows(filter)
+        if allowed is not None and not len(allowed):
+            return []
+
+        # 1. hamming distance on the sign codes
+        candidates_wanted = k * self.oversample if self.oversample > 0 else rows
+        if candidates_wanted >= (rows if allowed is None else len(allowed)):
+            candidates = np.arange(rows) if allowed is None else allowed
+        else:
+            query_code = np.packbits(query > 0)
+            distances = np.empty(rows, dtype=np.uint16)
+            for start in range(0, rows, _SCAN_BLOCK):
+                block = maps["codes"][start:start + _SCAN_BLOCK]
+                distances[start:start + len(block)] = hamming(block, query_code)
+            if allowed is not None:
+                masked = np.full(rows, np.iinfo(np.uint16).max, dtype=np.uint16)
+                masked[allowed] = distances[allowed]
+                distances = masked
+            candidates = np.argpartition(distances, candidates_wanted)[:candidates_wanted]
+            candidates.sort()  # sequential reads from the mapped file
+
+        # 2. exact-ish cosine on the int8 vectors of the candidates
+        scores = (maps["vectors"][candidates].astype(np.float32) @ query) * maps["scales"][candidates]
+        top = np.argsort(-scores)[:k]
+        return [(int(candidates[i]), float(scores[i])) for i in top]
+
+    def _documents(self, column: str, keys: list) -> dict:
+        """{row or id: Document} for the given rows / ids."""
+        found = {}
+        for start in range(0, len(keys), 500):
+            page = keys[start:start + 500]
+            marks = ",".join("?" * len(page))
+            sql = f"SELECT row, id, text, metadata FROM docs WHERE {column} IN ({marks})"
+            for row, doc_id, text, metadata in self._conn().execute(sql, page):
+                document = Document(id=doc_id, page_content=text, metadata=json.loads(metadata))
+                found[row if column == "row" else doc_id] = (row, document)
+        return found
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: list[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        hits = self._search(embedding, k, filter)
+        documents = self._documents("row", [row for row, _ in hits])
+        return [(documents[row][1], score) for row, score in hits if row in documents]
+
+    def similarity_search_by_vector(
+        self, embedding: list[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score  # already a cosine similarity
+
+    def get_by_ids(self, ids, /) -> list[Document]:
+        documents = self._documents("id", list(ids))
+        return [documents[doc_id][1] for doc_id in ids if doc_id in documents]
+
+    def get(self, ids: Optional[list[str]] = None, include: Optional[list[str]] = None, where: Optional[dict] = None) -> dict:
+        """
+        Chroma-style get: {"ids", "documents", "metadatas", "embeddings"} for the
+        given ids (or everything / the `where` filter), so the store code can use
+        either backend. Embeddings are the de-quantized vectors.
+        """
+        include = ["documents", "metadatas"] if include is None else include
+        if ids is not None:
+            found = self._documents("id", list(ids))
+            selected = [found[doc_id] for doc_id in ids if doc_id in found]
+        else:
+            allowed = self._allowed_rows(where)
+            allowed_rows = None if allowed is None else set(allowed.tolist())
+            sql = "SELECT row, id, text, metadata FROM docs ORDER BY row"
+            selected = [
+                (row, Document(id=doc_id, page_content=text, metadata=json.loads(metadata)))
+                for row, doc_id, text, metadata in self._conn().execute(sql)
+                if allowed_rows is None or row in allowed_rows
+            ]
+
+        result: dict[str, Any] = {"ids": [doc.id for _, doc in selected]}
+        if "documents" in include:
+            result["documents"] = [doc.page_content for _, doc in selected]
+        if "metadatas" in include:
+            result["metadatas"] = [doc.metadata for _, doc in selected]
+        if "embeddings" in include:
+            rows = np.array([row for row, _ in selected], dtype=np.int64)
+            if len(rows):
+                maps = self._mapped(self._rows())
+                result["embeddings"] = maps["vectors"][rows].astype(np.float32) * maps["scales"][rows][:, None]
+            else:
+                result["embeddings"] = np.zeros((0, self._dim() or 0), dtype=np.float32)
+        return result
+
+    def __len__(self) -> int:
+        return self._rows()
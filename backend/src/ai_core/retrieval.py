@@ -0,0 +1,127 @@
+import numpy as np
+from langchain_core.documents import Document
+from starlette.concurrency import run_in_threadpool
+from . import config, metrics, store
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = config.RRF_K) -> list[str]:
+    """
+    Merges several ranked id lists: each list adds 1 / (k + rank) to an id's score.
+    Ids ranked well by either search end up on top.
+    """
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda doc_id: scores[doc_id], reverse=True)
+
+
+def hybrid_search(question: str, k: int = config.RETRIEVER_K, query_vector=None, agent_id=None) -> list[Document]:
+    """
+    First-stage retrieval: dense search in Chroma plus BM25 keyword search,
+    fused with reciprocal rank fusion. Keyword search catches exact names
+    ("Binbyte Technologies") that the embedding may rank low.
+    Pass query_vector when the question is already embedded.
+    Only the agent's own collection and keyword index are searched.
+    """
+    if not store.has_knowledge(agent_id):
+        return []
+    db = store.get_vector_store(agent_id)
+    fetch_k = max(config.DENSE_FETCH_K, k)
+    if query_vector is None:
+        dense = db.similarity_search(question, k=fetch_k)
+    else:
+        dense = db.similarity_search_by_vector(list(query_vector), k=fetch_k)
+    keyword = store.get_keyword_index(agent_id).search(question, max(config.KEYWORD_FETCH_K, k))
+
+    by_id = {doc.id: doc for doc in dense if doc.id}
+    ranked = reciprocal_rank_fusion([list(by_id), [doc_id for doc_id, _ in keyword]])[:k]
+
+    # keyword-only hits still need their text
+    missing = [doc_id for doc_id in ranked if doc_id not in by_id]
+    if missing:
+        by_id.update({doc.id: doc for doc in db.get_by_ids(missing)})
+    return [by_id[doc_id] for doc_id in ranked if doc_id in by_id]
+
+
+async def ahybrid_search(question: str, k: int = config.RETRIEVER_K, agent_id=None) -> list[Document]:
+    """Same as hybrid_search, in a worker thread (Chroma and numpy are blocking)."""
+    return await run_in_threadpool(hybrid_search, question, k, None, agent_id)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def mmr_order(query_vector: np.ndarray, doc_vectors: np.ndarray, lambda_mult: float = config.MMR_LAMBDA) -> list[int]:
+    """
+    Maximal marginal relevance: repeatedly picks the candidate most similar to
+    the question and least similar to what was already picked, so near-duplicate
+    chunks don't eat the context budget.
+    """
+    query = _normalize(np.asarray(query_vector, dtype=np.float32))
+    docs = _normalize(np.asarray(doc_vectors, dtype=np.float32))
+    relevance = docs @ query
+    similarity = docs @ docs.T
+
+    order: list[int] = []
+    remaining = list(range(len(docs)))
+    while remaining:
+        if order:
+            redundancy = similarity[np.ix_(remaining, order)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining), dtype=np.float32)
+        scores = lambda_mult * relevance[remaining] - (1 - lambda_mult) * redundancy
+        order.append(remaining.pop(int(np.argmax(scores))))
+    return order
+
+
+def retrieve_context(question: str, query_vector=None, agent_id=None) -> tuple[list[Document], dict]:
+    """
+    Full retrieval stage for the prompt:
+    1. over-fetch RERANK_CANDIDATES with hybrid search
+    2. rerank them with MMR on the embeddings already stored in Chroma
+    3. keep the best chunks (at most RETRIEVER_K) that fit CONTEXT_TOKEN_BUDGET
+
+    Returns (documents, stats) where stats has the candidate / chunk / token counts.
+    Agents without a knowledge base get an empty context.
+    """
+    if not store.has_knowledge(agent_id):
+        return [], {"candidates": 0, "context_chunks": 0, "context_tokens": 0}
+    db = store.get_vector_store(agent_id)
+    if query_vector is None:
+        with metrics.stage("embed"):
+            query_vector = store.get_embeddings().embed_query(question)
+    with metrics.stage("retrieve"):
+        return _select_context(db, question, query_vector, agent_id)
+
+
+def _select_context(db, question: str, query_vector, agent_id) -> tuple[list[Document], dict]:
+    candidates = hybrid_search(question, k=config.RERANK_CANDIDATES, query_vector=query_vector, agent_id=agent_id)
+
+    if len(candidates) > 1:
+        stored = db.get(ids=[doc.id for doc in candidates], include=["embeddings"]) # type: ignore
+        vectors = dict(zip(stored["ids"], stored["embeddings"]))
+        ranked = [doc for doc in candidates if doc.id in vectors]
+        order = mmr_order(np.asarray(query_vector), np.stack([vectors[doc.id] for doc in ranked]))
+        candidates = [ranked[i] for i in order]
+
+    packed: list[Document] = []
+    used = 0
+    for doc in candidates:
+        if len(packed) >= config.RETRIEVER_K:
+            break
+        tokens = store.count_tokens(doc.page_content)
+        if used + tokens > config.CONTEXT_TOKEN_BUDGET:
+            continue # too big for what is left; a shorter chunk may still fit
+        packed.append(doc)
+        used += tokens
+
+    stats = {"candidates": len(candidates), "context_chunks": len(packed), "context_tokens": used}
+    return packed, stats
+
+
+async def aretrieve_context(question: str, query_vector=None, agent_id=None) -> tuple[list[Document], dict]:
+    """Same as retrieve_context, in a worker thread."""
+    return await run_in_threadpool(retrieve_context, question, query_vector, agent_id)
@@ -1,22 +1,170 @@
-from fastapi import APIRouter, HTTPException, status
+import json
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
 from .schema import IngestRequest, QueryRequest
-from . import store,chat
+from . import store,chat,ingest_jobs
+from .cache import answer_cache
+from .engine import ai_engine
+from .memory import conversation_memory, format_history
+from sqlalchemy import select
+from src.db.session import AsyncSessionLocal
+from src.objects.agents.model import Agent
+from src.objects.user.model import User
+from src.shared.services.db_service import DatabaseService
+from src.shared.dependency.jwt.operations import tokenOperations, security
 
 aiApp = APIRouter(prefix='/ai',tags=["AI ENGINE"])
 
+async def _check_agent_owner(agent_id: UUID | None, credentials: HTTPAuthorizationCredentials | None):
+    """
+    Only the agent's own account may add to its knowledge base, and only for an
+    agent that exists: checked before any collection or index is created.
+    """
+    if agent_id is None:
+        return  # the shared knowledge base
+    user = tokenOperations.get_token_decoded(credentials)  # type: ignore # 401 when missing / expired
+    if user["user_id"] != str(agent_id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to change this agent's knowledge")
+    async with AsyncSessionLocal() as session: # type: ignore
+        if await session.scalar(select(Agent.id).where(Agent.id == agent_id)) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Agent not found")
+
+
 @aiApp.post("/ingest")
-async def ingest_knowledge(request: IngestRequest):
+async def ingest_knowledge(request: IngestRequest, credentials: HTTPAuthorizationCredentials | None = Depends(security)):
+    await _check_agent_owner(request.agent_id, credentials)
     try:
-        store.add_text_to_base(request.texts)
-        return {"status": "success", "message": "Knowledge added to ai brain"}
+        counts = await store.add_text_to_base_async(request.texts, request.agent_id)
+        return {
+            "status": "success",
+            "message": "Knowledge added to ai brain",
+            "added": counts["added"],  # new chunks
+            "skipped": counts["skipped"],  # chunks that were already stored
+        }
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 
+@aiApp.post("/ingest/bulk", status_code=status.HTTP_202_ACCEPTED)
+async def ingest_knowledge_bulk(request: IngestRequest, credentials: HTTPAuthorizationCredentials | None = Depends(security)):
+    """
+    For large uploads: chunks, embeds and stores the texts in the background.
+    Poll /ai/ingest/jobs/{job_id} for progress.
+    """
+    await _check_agent_owner(request.agent_id, credentials)
+    job = await ingest_jobs.start_job(request.texts, request.agent_id)
+    return job
+
+
+@aiApp.get("/ingest/jobs/{job_id}")
+async def ingest_job_status(job_id: str):
+    job = await ingest_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ingest job not found")
+    return job
+
+
+def _thread_user(request: QueryRequest, credentials: HTTPAuthorizationCredentials | None) -> UUID | None:
+    """
+    The signed-in user when the question belongs to a user <-> agent thread
+    (agent_id plus a bearer token), None for stateless questions.
+    The token is only checked when a thread is used, so anonymous clients keep working.
+    """
+    if not (request.agent_id and credentials):
+        return None
+    user = tokenOperations.get_token_decoded(credentials)  # 401 when missing / expired
+    return UUID(user["user_id"])  # from the token only, never from the request body
+
+
+async def _load_history(user_id: UUID, agent_id: UUID) -> str:
+    """
+    Checks the thread can exist (the agent exists, the caller is a user account)
+    and returns the conversation so far, before anything is retrieved or generated.
+    Uses its own short session: none is held during generation.
+    """
+    async with AsyncSessionLocal() as session: # type: ignore
+        if await session.scalar(select(Agent.id).where(Agent.id == agent_id)) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Agent not found")
+        if await session.scalar(select(User.id).where(User.id == user_id)) is None:
+            # e.g. an agent's own token: messages can only belong to user accounts
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only users can talk to an agent")
+        summary, turns = await conversation_memory.load(DatabaseService(session), user_id, agent_id)
+    return format_history(summary, turns)
+
+
+async def _remember(user_id: UUID, agent_id: UUID, question: str, answer: str):
+    async with AsyncSessionLocal() as session: # type: ignore
+        await conversation_memory.remember(DatabaseService(session), user_id, agent_id, question, answer)
+
+
 @aiApp.post("/ask")
-async def ask_question(request: QueryRequest):
+async def ask_question(request: QueryRequest, credentials: HTTPAuthorizationCredentials | None = Depends(security)):
+    """
+    Answers from the agent's knowledge. With agent_id and a bearer token the
+    question is answered within the signed-in user's conversation with the
+    agent, and both messages are saved. Without them no database is touched.
+    """
+    user_id = _thread_user(request, credentials)
     try:
-        answer = chat.ask_ai(request.question)
-        return {"answer": answer}
+        if user_id is None:
+            return await chat.ask_ai_async(request.question, request.agent_id)
+        history = await _load_history(user_id, request.agent_id) # type: ignore
+        result = await chat.ask_ai_async(request.question, request.agent_id, history)
+        await _remember(user_id, request.agent_id, request.question, result["answer"]) # type: ignore
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@aiApp.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the models are loaded, 503 while starting (or if start-up failed)."""
+    if not ai_engine.ready:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="AI engine is not ready")
+    return ai_engine.status()
+
+
+@aiApp.get("/cache/stats")
+async def cache_stats():
+    """Hit rate and lookup latency of the semantic answer cache (this worker only)."""
+    return answer_cache.snapshot()
+
+
+def _sse(event: str, data: dict) -> str:
+    """Formats one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@aiApp.post("/ask/stream")
+async def ask_question_stream(request: QueryRequest, credentials: HTTPAuthorizationCredentials | None = Depends(security)):
+    """
+    Same as /ask, but the answer is streamed as server-sent events:
+    `token` events carry pieces of the answer, `done` closes the stream
+    (with the token usage)
+    and `error` reports a failure after the stream has started.
+    """
+    user_id = _thread_user(request, credentials)
+    history = await _load_history(user_id, request.agent_id) if user_id is not None else "" # type: ignore
+
+    async def event_stream():
+        try:
+            usage: dict = {}
+            parts = []
+            async for token in chat.stream_ai(request.question, usage, request.agent_id, history):
+                parts.append(token)
+                yield _sse("token", {"text": token})
+            if user_id is not None:
+                await _remember(user_id, request.agent_id, request.question, "".join(parts)) # type: ignore
+            yield _sse("done", {"usage": usage})
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},  # stop proxies from buffering
+    )
\ No newline at end of file
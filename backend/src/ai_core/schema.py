@@ -1,9 +1,12 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+from uuid import UUID
 
 class IngestRequest(BaseModel):
     texts: List[str] # list of strings to learn
+    agent_id: Optional[UUID] = None # whose knowledge base (None -> shared one); needs that agent's token
 
 class QueryRequest(BaseModel):
     question:str
+    agent_id: Optional[UUID] = None # only this agent's knowledge is searched
     
\ No newline at end of file
@@ -1,50 +1,292 @@
 import os
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from starlette.concurrency import run_in_threadpool
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 # from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_classic.embeddings import CacheBackedEmbeddings
+from langchain_classic.storage import LocalFileStore
 from langchain_chroma import Chroma
 from . import config
+from .cache import answer_cache
+from .keyword_index import KeywordIndex
+from .quantized_store import QuantizedVectorStore
 
-# Global variable to hold the database instance
-_vector_db = None
+# Global variables holding the shared instances
+_embeddings = None
+_client = None
+_vector_dbs: dict[str, Chroma | QuantizedVectorStore] = {}  # one collection per agent
+_keyword_indexes: dict[str, KeywordIndex] = {}
+_splitter = None
+_tokenizer = None
+# guards the one-time setup so concurrent first requests don't build it twice
+_init_lock = threading.RLock() # re-entrant: the keyword index setup needs the vector store
 
-def _initialize_db():
+# limits how many ingest batches are embedded at the same time
+_ingest_slots = asyncio.Semaphore(config.AI_MAX_CONCURRENT_INGESTS)
+
+GLOBAL_SCOPE = "global"
+
+def scope_of(agent_id=None) -> str:
     """
-    Internal function to create the database connection if it doesn't exist.
+    Name of the knowledge partition for an agent.
+    Requests without an agent use the shared (pre multi-tenant) knowledge base.
     """
-    print("Initializing Vector Database...")
-    
-    # 1. Setup Embeddings
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
+    return GLOBAL_SCOPE if agent_id is None else str(agent_id).replace("-", "")
+
+def _collection_name(scope: str) -> str:
+    return "my_knowledge_base" if scope == GLOBAL_SCOPE else f"agent_{scope}"
+
+def _keyword_index_path(scope: str) -> str:
+    return config.KEYWORD_INDEX_PATH if scope == GLOBAL_SCOPE else os.path.join(config.KEYWORD_INDEX_PATH, "agents", scope)
+
+def get_embeddings():
+    """
+    Singleton Accessor for the embedding model (shared by every agent).
+    """
+    global _embeddings
+    if _embeddings is None:
+        with _init_lock:
+            if _embeddings is None:
+                model = HuggingFaceEmbeddings(
+                    model_name=config.EMBEDDING_MODEL_NAME,
+                    cache_folder=config.EMBEDDING_MODEL_CACHE_DIR,
+                    model_kwargs={"local_files_only": config.EMBEDDING_LOCAL_ONLY},
+                )
+                # cache document vectors on disk so re-ingesting the same text costs no model time
+                _embeddings = CacheBackedEmbeddings.from_bytes_store(
+                    model,
+                    LocalFileStore(config.EMBEDDING_CACHE_PATH),
+                    namespace=config.EMBEDDING_MODEL_NAME,
+                    key_encoder="sha256",
+                )
+    return _embeddings
+
+def _get_client():
+    """The Chroma client shared by every collection."""
+    global _client
+    if _client is None:
+        with _init_lock:
+            if _client is None:
+                # We explicitly verify the path exists to avoid silent errors
+                if not os.path.exists(config.VECTOR_DB_PATH):
+                    os.makedirs(config.VECTOR_DB_PATH)
+                import chromadb
+                _client = chromadb.PersistentClient(path=config.VECTOR_DB_PATH)
+    return _client
+
+def _initialize_db(scope: str):
+    """
+    Internal function to open (or create) the collection of one agent.
+    Every agent gets its own collection, so a search only walks that agent's data.
+    """
+    print(f"Initializing Vector Database ({scope})...")
 
-    # 2. Setup ChromaDB
-    # We explicitly verify the path exists to avoid silent errors
-    if not os.path.exists(config.VECTOR_DB_PATH):
-        os.makedirs(config.VECTOR_DB_PATH)
+    if config.AI_VECTOR_BACKEND == "quantized":
+        path = os.path.join(config.QUANTIZED_INDEX_PATH, _collection_name(scope))
+        db = QuantizedVectorStore(path, get_embeddings(), oversample=config.QUANTIZED_OVERSAMPLE)
+        print(f"Quantized vector index initialized at: {path}")
+        return db
 
     db = Chroma(
-        persist_directory=config.VECTOR_DB_PATH,
-        embedding_function=embeddings,
-        collection_name="my_knowledge_base"
+        client=_get_client(),
+        embedding_function=get_embeddings(),
+        collection_name=_collection_name(scope),
     )
     print(f"Vector Database initialized at: {config.VECTOR_DB_PATH}")
     return db
 
-def get_vector_store():
+def get_vector_store(agent_id=None):
     """
-    Singleton Accessor: Ensures we always return a valid database object.
+    Singleton Accessor: Ensures we always return a valid database object
+    for the agent (or the shared knowledge base when agent_id is None).
     """
-    global _vector_db
-    if _vector_db is None:
-        _vector_db = _initialize_db()
-    return _vector_db
+    scope = scope_of(agent_id)
+    db = _vector_dbs.get(scope)
+    if db is None:
+        with _init_lock:
+            db = _vector_dbs.get(scope)
+            if db is None: # another thread may have finished while we waited
+                db = _vector_dbs[scope] = _initialize_db(scope)
+    return db
+
+def has_knowledge(agent_id=None) -> bool:
+    """
+    True if the agent already has a knowledge base. The query path checks this
+    first, so an arbitrary agent_id never creates a collection, an index or a
+    cached store (only ingesting does).
+    """
+    scope = scope_of(agent_id)
+    if scope == GLOBAL_SCOPE or scope in _vector_dbs:
+        return True
+    if config.AI_VECTOR_BACKEND == "quantized":
+        return os.path.exists(os.path.join(config.QUANTIZED_INDEX_PATH, _collection_name(scope), "docs.sqlite"))
+    try:
+        _get_client().get_collection(_collection_name(scope))  # open only, never create
+        return True
+    except Exception:  # NotFoundError (ValueError on older chromadb)
+        return False
 
-def add_text_to_base(texts: list[str]):
+def get_keyword_index(agent_id=None) -> KeywordIndex:
+    """
+    Singleton Accessor for the agent's BM25 keyword index.
+    If the index is empty but the collection is not (knowledge ingested
+    before the index existed), it is built once from the stored documents.
     """
-    Adds text to the database.
+    scope = scope_of(agent_id)
+    index = _keyword_indexes.get(scope)
+    if index is None:
+        with _init_lock:
+            index = _keyword_indexes.get(scope)
+            if index is None:
+                index = KeywordIndex(_keyword_index_path(scope))
+                if not len(index):
+                    stored = get_vector_store(agent_id).get(include=["documents"])
+                    index.add(list(zip(stored["ids"], stored["documents"])))
+                _keyword_indexes[scope] = index
+    return index
+
+def document_id(text: str) -> str:
     """
-    db = get_vector_store() # Use the getter to ensure it's initialized
-    print("Adding documents to vector store...")
-    db.add_texts(texts)
-    print("Done!")
\ No newline at end of file
+    Deterministic id for a piece of text.
+    The same text always maps to the same id, so storing it twice is an upsert.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def get_tokenizer():
+    """
+    The embedding model's tokenizer, shared by the splitter and the prompt
+    token counter.
+    """
+    global _tokenizer
+    if _tokenizer is None:
+        with _init_lock:
+            if _tokenizer is None:
+                from transformers import AutoTokenizer
+                _tokenizer = AutoTokenizer.from_pretrained(
+                    config.EMBEDDING_MODEL_NAME,
+                    cache_dir=config.EMBEDDING_MODEL_CACHE_DIR,
+                    local_files_only=config.EMBEDDING_LOCAL_ONLY,
+                )
+    return _tokenizer
+
+def count_tokens(text: str) -> int:
+    """Token count of a text (MiniLM tokenizer; close enough to size LLM prompts)."""
+    return len(get_tokenizer().encode(text, add_special_tokens=False))
+
+def get_splitter():
+    """
+    Token-aware splitter using the embedding model's own tokenizer,
+    so chunk sizes match what MiniLM actually reads.
+    """
+    global _splitter
+    if _splitter is None:
+        with _init_lock:
+            if _splitter is None:
+                _splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+                    get_tokenizer(),
+                    chunk_size=config.CHUNK_TOKENS,
+                    chunk_overlap=config.CHUNK_OVERLAP_TOKENS,
+                )
+    return _splitter
+
+def split_texts(texts: list[str]) -> dict[str, tuple[str, dict]]:
+    """
+    Splits texts into overlapping chunks.
+    Returns {chunk_id: (chunk_text, metadata)} with duplicates already removed.
+    """
+    splitter = get_splitter()
+    chunks = {}
+    for text in texts:
+        source_id = document_id(text)
+        for position, chunk in enumerate(splitter.split_text(text)):
+            chunks.setdefault(document_id(chunk), (chunk, {"source_id": source_id, "chunk": position}))
+    return chunks
+
+def _existing_ids(db, ids: list[str], page: int = 1000) -> set[str]:
+    """Ids already in the collection, looked up in pages to keep requests small."""
+    found = set()
+    for start in range(0, len(ids), page):
+        found.update(db.get(ids=ids[start:start + page], include=[])["ids"])
+    return found
+
+def ingest_documents(texts: list[str], progress=None, agent_id=None) -> dict:
+    """
+    Bulk ingestion pipeline:
+    1. split every text into token-sized overlapping chunks
+    2. skip chunks the collection already has
+    3. embed the rest in fixed-size batches on several worker threads
+    4. write each finished batch to Chroma in one call
+
+    progress(done, total) is called after every written batch.
+    Everything goes into the agent's own collection (agent_id=None -> shared one).
+    Returns chunk counts: {"added": new chunks, "skipped": chunks already stored}.
+    """
+    db = get_vector_store(agent_id) # Use the getter to ensure it's initialized
+    # opened before anything is written: a first-time open rebuilds from the collection,
+    # and the new chunks must not be picked up there and then added again below
+    keyword_index = get_keyword_index(agent_id)
+    chunks = split_texts(texts)
+    existing = _existing_ids(db, list(chunks))
+    new_ids = [chunk_id for chunk_id in chunks if chunk_id not in existing]
+    total = len(new_ids)
+    if progress:
+        progress(0, total)
+    if not new_ids:
+        print("Nothing new to add.")
+        return {"added": 0, "skipped": len(existing)}
+
+    print(f"Adding {total} chunks to vector store ({len(existing)} already stored)...")
+    batches = [new_ids[i:i + config.EMBED_BATCH_SIZE] for i in range(0, total, config.EMBED_BATCH_SIZE)]
+
+    def embed(batch):
+        # vectors land in the embedding cache, so add_texts below does not recompute them
+        db.embeddings.embed_documents([chunks[chunk_id][0] for chunk_id in batch]) # type: ignore
+        return batch
+
+    done = 0
+    try:
+        with ThreadPoolExecutor(max_workers=config.EMBED_WORKERS) as pool:
+            for future in as_completed([pool.submit(embed, batch) for batch in batches]):
+                batch = future.result()
+                db.add_texts(
+                    [chunks[chunk_id][0] for chunk_id in batch],
+                    metadatas=[chunks[chunk_id][1] for chunk_id in batch],
+                    ids=batch,
+                )
+                done += len(batch)
+                if progress:
+                    progress(done, total)
+    finally:
+        if done:
+            # every write path ends here: cached answers of this agent may be outdated now
+            # (also after a failed upload, whatever batches made it in are searchable)
+            answer_cache.invalidate_sync(agent_id)
+
+    # the whole upload becomes one keyword index segment
+    keyword_index.add([(chunk_id, chunks[chunk_id][0]) for chunk_id in new_ids])
+    print("Done!")
+    return {"added": total, "skipped": len(existing)}
+
+def add_text_to_base(texts: list[str], agent_id=None) -> dict:
+    """
+    Adds text to the database (chunked, skipping what is already stored).
+    Returns {"added": new chunks, "skipped": chunks already stored}.
+    """
+    return ingest_documents(texts, agent_id=agent_id)
+
+async def ingest_documents_async(texts: list[str], progress=None, agent_id=None) -> dict:
+    """
+    Same as ingest_documents, without blocking the event loop.
+    Embedding is CPU heavy, so it runs in a worker thread, and only a few
+    ingests may run at once so they can't starve the rest of the API.
+    """
+    async with _ingest_slots:
+        return await run_in_threadpool(ingest_documents, texts, progress, agent_id)
+
+async def add_text_to_base_async(texts: list[str], agent_id=None) -> dict:
+    """Adds text to the database without blocking the event loop (see ingest_documents_async)."""
+    return await ingest_documents_async(texts, agent_id=agent_id)
\ No newline at end of file
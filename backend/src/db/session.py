@@ -1,4 +1,5 @@
 from fastapi import Depends
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from typing import AsyncGenerator
@@ -27,12 +28,23 @@ AsyncSessionLocal = sessionmaker(
 ) # type: ignore
 
 
+# Indexes added after the first deploy (kept in sync with the models' __table_args__)
+POST_CREATE_INDEXES = [
+    # AI conversation memory: latest messages of a user <-> agent thread
+    "CREATE INDEX IF NOT EXISTS ix_messages_user_agent_created ON messages (user_id, agent_id, created_at)",
+]
+
+
 async def init_db():
     async with async_engine.begin() as conn:
         print("Creating tables...")
         print("Tables to create:", Base.metadata.tables.keys())
         # await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
+        # create_all skips tables that already exist, so indexes added to a model
+        # later never reach deployed databases on their own
+        for statement in POST_CREATE_INDEXES:
+            await conn.execute(text(statement))
 
 
 
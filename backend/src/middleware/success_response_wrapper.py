@@ -1,51 +1,52 @@
-from fastapi.responses import JSONResponse
+from contextvars import ContextVar
+from typing import Any, Optional
 from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-import json
+from fastapi.responses import JSONResponse
 
 from src.shared.response_structure import model_response
-from typing import Callable, Awaitable
-from starlette.responses import Response
-
-class SuccessResponseWrapperMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: Callable[[Request], Awaitable[Response]]):
-        # Skip OpenAPI and excluded paths
-        EXCLUDE_PATHS = {"/openapi.json", "/health", "/metrics", "/docs"}
-        if request.url.path in EXCLUDE_PATHS:
-            return await call_next(request)
-
-        response = await call_next(request)
-        content_type = response.headers.get("content-type", "").lower()
-
-        if response.status_code < 400 and content_type.startswith("application/json"):
-            body = [section async for section in response.body_iterator]
-            raw_body = b"".join(body).decode("utf-8")
-
-            try:
-                parsed = json.loads(raw_body)
-            except json.JSONDecodeError:
-                parsed = raw_body
-
-            # Prevent double wrapping
-            if isinstance(parsed, dict) and "status" in parsed and "message" in parsed and "data" in parsed:
-                return Response(
-                    content=json.dumps(parsed),
-                    status_code=response.status_code,
-                    headers=dict(response.headers),
-                    media_type="application/json"
-                )
-
-            wrapped = model_response(
+
+# Paths whose JSON goes out as is (scrapers / tooling expect the raw payload)
+EXCLUDE_PATHS = {"/openapi.json", "/health", "/metrics", "/docs"}
+
+# method + path of the request being answered, read when the response is rendered
+_request_info: ContextVar[Optional[dict]] = ContextVar("envelope_request_info", default=None)
+
+
+async def envelope_context(request: Request):
+    """
+    App-wide dependency: remembers the method and path of the request
+    so EnvelopeJSONResponse can put them in the envelope.
+    """
+    _request_info.set({"method": request.method, "path": request.url.path})
+
+
+def _is_wrapped(content: Any) -> bool:
+    # Prevent double wrapping
+    return isinstance(content, dict) and "status" in content and "message" in content and "data" in content
+
+
+class EnvelopeJSONResponse(JSONResponse):
+    """
+    Default response class of the app: successful payloads are wrapped with
+    model_response while they are serialized, so each body is encoded once
+    and nothing is buffered or re-parsed afterwards.
+    Error responses (built by the exception handlers) and streaming
+    responses (e.g. /ai/ask/stream) never pass through here.
+    """
+
+    def render(self, content: Any) -> bytes:
+        info = _request_info.get()
+        if info is not None and info["path"] in EXCLUDE_PATHS:
+            return super().render(content)
+        if self.status_code < 400 and not _is_wrapped(content):
+            content = model_response(
                 status=True,
                 message="Request was successful",
                 error={
                     "dev_message": "Everything went well",
                     "user_message": "Request was successful",
-                    "extra": {"method": request.method, "path": request.url.path},
+                    "extra": info or {},
                 },
-                data=parsed,
+                data=content,
             )
-
-            return JSONResponse(content=wrapped, status_code=response.status_code)
-
-        return response
+        return super().render(content)
@@ -1,6 +1,6 @@
 from src.models.base import TimestampedModel, UUIDModel
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID as pgID
 from uuid import UUID
 from typing import Optional
@@ -9,6 +9,8 @@ from src.objects.user.model import User
 
 
 class Message(UUIDModel,TimestampedModel):
+    # one index scan returns the latest messages of a user <-> agent thread (AI conversation memory)
+    __table_args__ = (Index("ix_messages_user_agent_created", "user_id", "agent_id", "created_at"),)
     imageUrl: Mapped[Optional[str]] = mapped_column(nullable=True)
     videoUrl: Mapped[Optional[str]] = mapped_column(nullable=True)
     audioUrl: Mapped[Optional[str]] = mapped_column(nullable=True)
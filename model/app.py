@@ -1,24 +1,23 @@
 import streamlit as st
-import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
-from tensorflow.keras.models import load_model
-from PIL import Image, ImageOps
+from PIL import Image
 import numpy as np
-import os
-import shutil
 import time
 
+import pandas as pd
+
+from config import (
+    MODEL_FILE, RETRAIN_THRESHOLD, INFERENCE_BATCH_SIZE,
+    RETRAIN_MODES, DEFAULT_RETRAIN_MODE,
+)
+from inference import InferenceEngine
+from jobs import RetrainJobManager, ACTIVE_STATES, COMPLETED
+from feedback_store import FeedbackStore
+from preprocessing import preprocess_batch, iter_zip_images
+
 # ==========================================
 # 1. SYSTEM CONFIGURATION
 # ==========================================
-MODEL_FILE = 'orange_quality_model.h5'
-RETRAIN_THRESHOLD = 5  # Number of images needed to unlock the "Retrain" button
-NEW_DATA_DIR = 'new_data'
-CLASSES = ['fresh', 'rotten'] # 0 = Fresh, 1 = Rotten
-
-# Create necessary folders if they don't exist
-os.makedirs(os.path.join(NEW_DATA_DIR, 'fresh'), exist_ok=True)
-os.makedirs(os.path.join(NEW_DATA_DIR, 'rotten'), exist_ok=True)
+# Paths and constants live in config.py so other tools can share them
 
 # Page Setup
 st.set_page_config(page_title="Smart Fruit Inspector", page_icon="🍊", layout="wide")
@@ -28,97 +27,150 @@ st.set_page_config(page_title="Smart Fruit Inspector", page_icon="🍊", layout=
 # ==========================================
 
 
+@st.cache_resource
+def get_inference_engine():
+    """One engine per server process, shared by every rerun and every operator."""
+    return InferenceEngine(MODEL_FILE)
+
 def load_current_model():
-    """Loads the model from disk. Not cached so we can reload updates."""
+    """Returns the resident model. The engine reloads it only when the file on disk changes."""
     try:
-        return load_model(MODEL_FILE)
+        return get_inference_engine().get_model()
     except Exception as e:
         st.error(f"CRITICAL ERROR: Could not load model. {e}")
         st.stop()
 
-def save_feedback_image(image, true_label):
-    """Saves the user-corrected image to the training folder."""
-    timestamp = int(time.time())
-    # Use a unique name so we don't overwrite files
-    filename = f"{true_label}_{timestamp}.jpg"
-    path = os.path.join(NEW_DATA_DIR, true_label, filename)
-    image.save(path)
-    return path
+def _decodes(image):
+    try:
+        preprocess_batch([image])
+        return True
+    except Exception:
+        return False
 
-def get_new_data_count():
-    """Counts total new images waiting in the 'fresh' and 'rotten' folders."""
-    total = 0
-    for category in CLASSES:
-        path = os.path.join(NEW_DATA_DIR, category)
-        total += len(os.listdir(path))
-    return total
-
-def retrain_brain():
+def score_images(images, batch_size=INFERENCE_BATCH_SIZE):
     """
-    AGGRESSIVE RETRAINING FUNCTION
-    Forces the model to over-fit on the new data to fix mistakes immediately.
+    Scores many images with one forward pass per batch.
+    Images are preprocessed chunk by chunk so a whole pallet never sits in RAM as floats.
+    Returns quality scores in % (same formula as the single inspection);
+    NaN for images that fail to decode (truncated / corrupt files), so one bad
+    picture never loses the rest of the pallet.
     """
-    progress_bar = st.progress(0, text="Initializing training...")
-    
-    # 1. SETUP DATA GENERATOR (HEAVY AUGMENTATION)
-    # We twist and turn the images so the model sees 'more' data than we actually have
-    train_datagen = ImageDataGenerator(
-        rescale=1./255,
-        rotation_range=20,
-        width_shift_range=0.2,
-        height_shift_range=0.2,
-        horizontal_flip=True,
-        fill_mode='nearest'
-    )
-    
-    train_generator = train_datagen.flow_from_directory(
-        NEW_DATA_DIR,
-        target_size=(224, 224),
-        batch_size=4, # Small batch size forces updates on every few images
-        class_mode='binary',
-        shuffle=True
+    load_current_model() # Fails loudly in the UI if the model is missing
+    engine = get_inference_engine()
+    scores = np.full(len(images), np.nan)
+    for start in range(0, len(images), batch_size):
+        chunk = images[start:start + batch_size]
+        try:
+            batch, readable = preprocess_batch(chunk), list(range(len(chunk)))
+        except Exception:
+            # Rare: find the broken picture(s) one by one and score the rest
+            readable = [i for i, image in enumerate(chunk) if _decodes(image)]
+            if not readable:
+                continue
+            batch = preprocess_batch([chunk[i] for i in readable])
+        rot_probs = engine.predict(batch, batch_size=batch_size)
+        scores[start + np.array(readable)] = (1.0 - rot_probs) * 100
+    return scores
+
+def collect_uploaded_images(uploaded_files):
+    """
+    Flattens a multi-file upload (single pictures and/or .zip archives) into (name, image) pairs.
+    image is None for files that can't be opened; they are reported as unreadable.
+    """
+    items = []
+    for uploaded in uploaded_files:
+        try:
+            if uploaded.name.lower().endswith('.zip'):
+                items.extend(iter_zip_images(uploaded))
+            else:
+                items.append((uploaded.name, Image.open(uploaded)))
+        except Exception:
+            # Not an image / broken archive: report it, keep the rest of the pallet
+            items.append((uploaded.name, None))
+    return items
+
+def get_bulk_scores(uploaded_files):
+    """
+    (item names, scores) for a bulk upload. Scores are kept in the session per
+    upload and model version, so moving the threshold slider never re-runs inference.
+    """
+    load_current_model() # Fails loudly in the UI if the model is missing
+    key = (tuple(uploaded.file_id for uploaded in uploaded_files), get_inference_engine().version)
+    cached = st.session_state.get('bulk_scores')
+    if cached is not None and cached[0] == key:
+        return cached[1], cached[2]
+
+    items = collect_uploaded_images(uploaded_files)
+    names = [name for name, _ in items]
+    scores = np.full(len(items), np.nan)
+    readable = [i for i, (_, image) in enumerate(items) if image is not None]
+    if readable:
+        with st.spinner(f"Inspecting {len(readable)} items..."):
+            scores[readable] = score_images([items[i][1] for i in readable])
+    st.session_state['bulk_scores'] = (key, names, scores)
+    return names, scores
+
+@st.cache_resource
+def get_feedback_store():
+    """Shared feedback index. Old per-folder images are migrated on first start."""
+    store = FeedbackStore()
+    store.import_legacy_folders()
+    return store
+
+def save_feedback_image(image, true_label, predicted_score=None):
+    """Saves the user-corrected image to the feedback store (content-addressed, never overwritten)."""
+    return get_feedback_store().add(
+        image,
+        true_label,
+        model_version=get_inference_engine().version,
+        predicted_score=predicted_score,
     )
 
-    if train_generator.samples == 0:
-        st.warning("No data found to train on!")
+def get_new_data_count():
+    """Counts corrections the current model has not learned yet (read from the manifest index)."""
+    return get_feedback_store().pending_count()
+
+@st.cache_resource
+def get_job_manager():
+    """One retraining manager per server process, so every operator sees the same job."""
+    return RetrainJobManager()
+
+@st.fragment(run_every=2)
+def render_training_status():
+    """Polls the background job every 2 seconds without rerunning the whole page."""
+    manager = get_job_manager()
+    job = manager.status()
+
+    if job and job['state'] in ACTIVE_STATES:
+        st.progress(job['progress'], text=job['message'])
+        if st.button("⛔ Cancel Training"):
+            manager.cancel()
+            st.toast("Cancel requested. The current model stays in service.")
         return
 
-    # 2. PREPARE MODEL
-    progress_bar.progress(20, text="Loading Neural Network...")
-    tf.keras.backend.clear_session() # Clear RAM to prevent crashes
-    model = load_model(MODEL_FILE)
-    
-    # UNFREEZE LAYERS (Allow the brain to change)
-    model.trainable = True
-    
-    # HIGH LEARNING RATE (Aggressive Mode)
-    # 0.001 is standard, 0.00001 is gentle. We use 0.001 to force changes.
-    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
-                  loss='binary_crossentropy',
-                  metrics=['accuracy'])
-    
-    # 3. TRAIN LOOP
-    progress_bar.progress(40, text="Training (20 Epochs)...")
-    
-    # Train for 20 rounds on this specific data
-    model.fit(train_generator, epochs=20, verbose=0)
-    
-    # 4. SAVE
-    progress_bar.progress(80, text="Saving new intelligence...")
-    model.save(MODEL_FILE)
-    
-    # 5. CLEANUP (Delete used images)
-    progress_bar.progress(90, text="Cleaning up workspace...")
-    for category in CLASSES:
-        folder = os.path.join(NEW_DATA_DIR, category)
-        for f in os.listdir(folder):
-            try:
-                os.remove(os.path.join(folder, f))
-            except:
-                pass # Ignore if file is already gone
-            
-    progress_bar.progress(100, text="Complete!")
-    time.sleep(1) # Let user see the 100%
+    if job and job['finished_at'] and time.time() - job['finished_at'] < 30:
+        # Show the outcome of the job that just finished
+        if job['state'] == COMPLETED:
+            st.success(job['message'])
+        else:
+            st.warning(job['message'])
+
+    new_imgs = get_new_data_count()
+    if new_imgs >= RETRAIN_THRESHOLD:
+        st.success("Buffer Full! Ready to Update.")
+        mode = st.selectbox(
+            "Training Mode",
+            RETRAIN_MODES,
+            index=RETRAIN_MODES.index(DEFAULT_RETRAIN_MODE),
+            format_func=lambda m: {"head": "⚡ Fast (classifier head only)", "full": "🐢 Full fine-tune"}[m],
+            help="Fast mode reuses cached image features and finishes in seconds on CPU.",
+        )
+        if st.button("🚀 UPDATE BRAIN NOW", type="primary"):
+            manager.start(mode=mode)
+            st.toast("Training started in the background. Keep inspecting!")
+            st.rerun(scope="fragment")
+    else:
+        st.info(f"Need {RETRAIN_THRESHOLD - new_imgs} more corrections to train.")
 
 # ==========================================
 # 3. SIDEBAR (CONTROLS & TRAINING)
@@ -145,18 +197,8 @@ with st.sidebar:
     st.progress(min(new_imgs / RETRAIN_THRESHOLD, 1.0))
     
     # --- C. MANUAL RETRAIN BUTTON ---
-    # Only show button if we have enough data
-    if new_imgs >= RETRAIN_THRESHOLD:
-        st.success("Buffer Full! Ready to Update.")
-        if st.button("🚀 UPDATE BRAIN NOW", type="primary"):
-            with st.spinner(" performing deep learning update..."):
-                retrain_brain()
-            st.balloons()
-            st.success("Model Updated Successfully!")
-            time.sleep(2)
-            st.rerun() # Refresh page to reload new model
-    else:
-        st.info(f"Need {RETRAIN_THRESHOLD - new_imgs} more corrections to train.")
+    # Training runs in a background worker; inspection keeps using the current model
+    render_training_status()
 
 # ==========================================
 # 4. MAIN INTERFACE
@@ -165,67 +207,117 @@ with st.sidebar:
 st.title("🍊 Intelligent Quality Control")
 st.markdown("---")
 
-col_left, col_right = st.columns([1, 1], gap="large")
+inspection_mode = st.radio(
+    "Inspection Mode",
+    ["Single Item", "Bulk Pallet"],
+    horizontal=True,
+    help="Bulk mode scores many images (or a .zip) in batches.",
+)
 
-# --- LEFT COLUMN: INPUT ---
-with col_left:
-    st.subheader("📸 1. Inspection Station")
-    uploaded_file = st.file_uploader("Upload Fruit Image", type=["jpg", "png", "jpeg"])
+if inspection_mode == "Single Item":
+    col_left, col_right = st.columns([1, 1], gap="large")
 
-    if uploaded_file:
-        image = Image.open(uploaded_file).convert('RGB')
-        st.image(image, caption="Current Item", use_container_width=True)
+    # --- LEFT COLUMN: INPUT ---
+    with col_left:
+        st.subheader("📸 1. Inspection Station")
+        uploaded_file = st.file_uploader("Upload Fruit Image", type=["jpg", "png", "jpeg"])
 
-# --- RIGHT COLUMN: RESULT & FEEDBACK ---
-with col_right:
-    if uploaded_file:
-        st.subheader("📊 2. AI Analysis")
+        if uploaded_file:
+            image = Image.open(uploaded_file).convert('RGB')
+            st.image(image, caption="Current Item", use_container_width=True)
+
+    # --- RIGHT COLUMN: RESULT & FEEDBACK ---
+    with col_right:
+        if uploaded_file:
+            st.subheader("📊 2. AI Analysis")
         
-        # 1. PREPROCESS
-        size = (224, 224)
-        img_resized = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
-        img_array = np.array(img_resized)
-        img_batch = np.expand_dims(img_array, axis=0)
-        img_preprocessed = tf.keras.applications.mobilenet_v2.preprocess_input(img_batch.astype(np.float32))
+            # 1. PREPROCESS (same pipeline as bulk mode, batch of one)
+            img_preprocessed = preprocess_batch([image])
         
-        # 2. PREDICT
-        model = load_current_model()
-        prediction = model.predict(img_preprocessed)
-        rot_prob = prediction[0][0]
-        quality_score = (1.0 - rot_prob) * 100
+            # 2. PREDICT
+            load_current_model() # Fails loudly in the UI if the model is missing
+            rot_prob = get_inference_engine().predict(img_preprocessed)[0]
+            quality_score = (1.0 - rot_prob) * 100
         
-        # 3. DISPLAY SCORES
-        # Color logic for the progress bar
-        bar_color = "green" if quality_score >= quality_threshold else "red"
-        st.write(f"**Quality Score:** {quality_score:.1f}%")
-        st.progress(int(quality_score))
+            # 3. DISPLAY SCORES
+            # Color logic for the progress bar
+            bar_color = "green" if quality_score >= quality_threshold else "red"
+            st.write(f"**Quality Score:** {quality_score:.1f}%")
+            st.progress(int(quality_score))
         
-        # 4. DECISION
-        if quality_score >= quality_threshold:
-            st.success(f"✅ PASSED INSPECTION")
-        else:
-            st.error(f"🔴 REJECTED")
+            # 4. DECISION
+            if quality_score >= quality_threshold:
+                st.success(f"✅ PASSED INSPECTION")
+            else:
+                st.error(f"🔴 REJECTED")
 
-        st.markdown("---")
+            st.markdown("---")
         
-        # 5. HUMAN FEEDBACK LOOP
-        st.subheader("🛠️ 3. Operator Override")
-        st.write("Is the analysis wrong? Correct it below:")
+            # 5. HUMAN FEEDBACK LOOP
+            st.subheader("🛠️ 3. Operator Override")
+            st.write("Is the analysis wrong? Correct it below:")
         
-        # Slider for manual rating
-        user_rating = st.slider("Set True Quality (%)", 0, 100, int(quality_score))
+            # Slider for manual rating
+            user_rating = st.slider("Set True Quality (%)", 0, 100, int(quality_score))
         
-        if st.button("💾 Submit Correction"):
-            # Determine Label based on User Rating
-            if user_rating > 50:
-                label = "fresh"
-                msg = "Marked as FRESH"
-            else:
-                label = "rotten"
-                msg = "Marked as ROTTEN"
+            if st.button("💾 Submit Correction"):
+                # Determine Label based on User Rating
+                if user_rating > 50:
+                    label = "fresh"
+                    msg = "Marked as FRESH"
+                else:
+                    label = "rotten"
+                    msg = "Marked as ROTTEN"
             
-            save_feedback_image(image, label)
+                save_feedback_image(image, label, predicted_score=quality_score)
             
-            st.toast(f"✅ {msg}! Added to training queue.")
-            time.sleep(1)
-            st.rerun() # Refresh to update the sidebar counter
\ No newline at end of file
+                st.toast(f"✅ {msg}! Added to training queue.")
+                time.sleep(1)
+                st.rerun() # Refresh to update the sidebar counter
+
+else:
+    # --- BULK MODE: A WHOLE PALLET AT ONCE ---
+    st.subheader("📦 Bulk Inspection")
+    uploaded_files = st.file_uploader(
+        "Upload Fruit Images or a .zip Archive",
+        type=["jpg", "png", "jpeg", "zip"],
+        accept_multiple_files=True,
+    )
+
+    if uploaded_files:
+        names, scores = get_bulk_scores(uploaded_files)
+
+        if not names:
+            st.warning("No images found in the upload.")
+        else:
+            unreadable = np.isnan(scores)
+            passed = ~unreadable & (scores >= quality_threshold)
+            results = pd.DataFrame({
+                "Item": names,
+                "Quality Score (%)": scores.round(1),
+                "Decision": np.select([unreadable, passed], ["⚠️ UNREADABLE", "✅ PASSED"], "🔴 REJECTED"),
+            })
+
+            # Summary for the whole batch
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("Items Inspected", int((~unreadable).sum()))
+            m2.metric("Passed", int(passed.sum()))
+            m3.metric("Rejected", int((~unreadable & ~passed).sum()))
+            m4.metric("Unreadable", int(unreadable.sum()))
+
+            st.dataframe(
+                results,
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "Quality Score (%)": st.column_config.ProgressColumn(
+                        "Quality Score (%)", min_value=0, max_value=100, format="%.1f"
+                    ),
+                },
+            )
+            st.download_button(
+                "⬇️ Download Report (CSV)",
+                results.to_csv(index=False),
+                file_name="inspection_report.csv",
+                mime="text/csv",
+            )
@@ -0,0 +1,184 @@
+"""
+Headless inference benchmark for the fruit quality model (no Streamlit needed).
+
+    python benchmark.py --iterations 100 --batch-sizes 8,32
+
+Measures the decode -> preprocess -> predict path with synthetic images for every model
+variant available (.h5 and the quantized TFLite export), reports cold load
+time, first-call latency, p50/p95/p99 latency and images/sec, and writes the
+results to benchmarks/ as JSON. The previous run is used as a baseline so
+slowdowns show up right away.
+
+    python benchmark.py --parity
+
+checks that the fast preprocessing path matches the original LANCZOS path.
+"""
+import argparse
+import io
+import json
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from config import BENCHMARK_DIR, TFLITE_FILE
+from inference import InferenceEngine, read_model_version
+from preprocessing import preprocess_batch, check_parity
+
+REGRESSION_THRESHOLD = 0.10 # Flag a p50 slowdown of more than 10%
+
+
+def synthetic_images(count, size=(640, 480), seed=0):
+    """
+    Random smooth RGB pictures, JPEG-encoded like a phone or conveyor camera frame.
+    Returned as raw bytes so every call pays the real decode cost.
+    """
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        blobs = Image.fromarray(rng.integers(0, 256, (size[1] // 16, size[0] // 16, 3), dtype=np.uint8))
+        buffer = io.BytesIO()
+        blobs.resize(size, Image.Resampling.BICUBIC).save(buffer, format='JPEG', quality=90)
+        frames.append(buffer.getvalue())
+    return frames
+
+
+def _open(frames):
+    return [Image.open(io.BytesIO(frame)) for frame in frames]
+
+
+def _summarize(latencies_ms, images_per_call):
+    latencies = np.asarray(latencies_ms)
+    return {
+        'calls': int(len(latencies)),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'mean_ms': float(latencies.mean()),
+        'images_per_sec': float(images_per_call * 1000.0 * len(latencies) / latencies.sum()),
+    }
+
+
+def _time_calls(engine, images, batch_size, iterations):
+    """Latency of preprocess + predict for `iterations` calls of `batch_size` images."""
+    latencies = []
+    for i in range(iterations):
+        start = (i * batch_size) % len(images)
+        chunk = images[start:start + batch_size]
+        if len(chunk) < batch_size:
+            chunk = chunk + images[:batch_size - len(chunk)]
+        t0 = time.perf_counter()
+        engine.predict(preprocess_batch(_open(chunk)), batch_size=batch_size)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return latencies
+
+
+def benchmark_backend(backend, images, batch_sizes, iterations):
+    """Cold load, first call and warm throughput for one model variant."""
+    engine = InferenceEngine(backend=backend)
+
+    t0 = time.perf_counter()
+    engine.get_model()
+    cold_load_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    engine.predict(preprocess_batch(_open(images[:1])), batch_size=1)
+    first_call_ms = (time.perf_counter() - t0) * 1000
+
+    result = {
+        'backend': engine.active_backend,
+        'cold_load_ms': cold_load_ms,
+        'first_call_ms': first_call_ms,
+        'single': _summarize(_time_calls(engine, images, 1, iterations), 1),
+        'batched': {},
+    }
+    for batch_size in batch_sizes:
+        # Fewer calls for big batches so every setting processes a similar number of images
+        calls = max(iterations // batch_size, 5)
+        _time_calls(engine, images, batch_size, 1) # Warm-up for this batch shape
+        result['batched'][str(batch_size)] = _summarize(
+            _time_calls(engine, images, batch_size, calls), batch_size
+        )
+    return result
+
+
+def compare_with_baseline(results, baseline):
+    """Returns human-readable warnings for variants whose p50 latency regressed."""
+    warnings = []
+    for name, current in results['variants'].items():
+        previous = baseline.get('variants', {}).get(name)
+        if not previous:
+            continue
+        rows = [('single', current['single'], previous['single'])]
+        rows += [
+            (f"batch {size}", stats, previous['batched'][size])
+            for size, stats in current['batched'].items() if size in previous.get('batched', {})
+        ]
+        for label, now, before in rows:
+            if now['p50_ms'] > before['p50_ms'] * (1 + REGRESSION_THRESHOLD):
+                warnings.append(
+                    f"{name} {label}: p50 {before['p50_ms']:.1f} ms -> {now['p50_ms']:.1f} ms"
+                )
+    return warnings
+
+
+def run_benchmark(iterations=50, batch_sizes=(8, 32), output_dir=BENCHMARK_DIR):
+    """Runs every available variant and writes the JSON report. Returns the results."""
+    images = synthetic_images(max(max(batch_sizes), 32))
+    backends = ['keras'] + (['tflite'] if os.path.exists(TFLITE_FILE) else [])
+
+    results = {
+        'model_version': read_model_version(),
+        'timestamp': time.time(),
+        'iterations': iterations,
+        'variants': {
+            backend: benchmark_backend(backend, images, batch_sizes, iterations)
+            for backend in backends
+        },
+    }
+
+    latest_file = os.path.join(output_dir, 'latest.json')
+    if os.path.exists(latest_file):
+        with open(latest_file) as f:
+            baseline = json.load(f)
+        results['regressions'] = compare_with_baseline(results, baseline)
+
+    os.makedirs(output_dir, exist_ok=True)
+    name = f"benchmark_v{results['model_version']}_{int(results['timestamp'])}.json"
+    with open(os.path.join(output_dir, name), 'w') as f:
+        json.dump(results, f, indent=2)
+    with open(latest_file, 'w') as f:
+        json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=50, help='single-image calls per variant')
+    parser.add_argument('--batch-sizes', default='8,32', help='comma separated batch sizes')
+    parser.add_argument('--output-dir', default=BENCHMARK_DIR)
+    parser.add_argument('--parity', action='store_true', help='only run the preprocessing parity check')
+    args = parser.parse_args()
+
+    if args.parity:
+        engine = InferenceEngine(backend='keras')
+        report = check_parity(synthetic_images(32), predict=engine.predict)
+        print(json.dumps(report, indent=2))
+        # Half a quality point is well below what an operator can tell apart
+        raise SystemExit(0 if report['score_max_abs_diff'] <= 0.5 else 1)
+
+    results = run_benchmark(
+        iterations=args.iterations,
+        batch_sizes=[int(b) for b in args.batch_sizes.split(',') if b],
+        output_dir=args.output_dir,
+    )
+    for name, variant in results['variants'].items():
+        print(f"[{name}] cold load {variant['cold_load_ms']:.0f} ms, first call {variant['first_call_ms']:.1f} ms")
+        print(f"  single   p50 {variant['single']['p50_ms']:.1f} ms  p95 {variant['single']['p95_ms']:.1f} ms  "
+              f"p99 {variant['single']['p99_ms']:.1f} ms  {variant['single']['images_per_sec']:.1f} img/s")
+        for size, stats in variant['batched'].items():
+            print(f"  batch {size:<3} p50 {stats['p50_ms']:.1f} ms  p95 {stats['p95_ms']:.1f} ms  "
+                  f"p99 {stats['p99_ms']:.1f} ms  {stats['images_per_sec']:.1f} img/s")
+    for warning in results.get('regressions', []):
+        print(f"REGRESSION: {warning}")
@@ -0,0 +1,76 @@
+import os
+
+# ==========================================
+# SHARED SETTINGS FOR THE FRUIT INSPECTOR
+# ==========================================
+# Everything is resolved relative to this folder so the Streamlit page,
+# background workers and command line tools all see the same files.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MODEL_FILE = os.path.join(BASE_DIR, 'orange_quality_model.h5')
+# Bumped every time a retrained model is published (see inference.publish_model)
+MODEL_VERSION_FILE = os.path.join(BASE_DIR, 'orange_quality_model.version')
+
+RETRAIN_THRESHOLD = 5  # Number of images needed to unlock the "Retrain" button
+NEW_DATA_DIR = os.path.join(BASE_DIR, 'new_data')
+CLASSES = ['fresh', 'rotten']  # 0 = Fresh, 1 = Rotten
+
+IMAGE_SIZE = (224, 224)  # MobileNetV2 input resolution
+
+# Bulk inspection: how many images go through one model.predict call.
+# Bigger is faster per image but needs more RAM (32 x 224 x 224 x 3 floats is ~19 MB).
+INFERENCE_BATCH_SIZE = 32
+
+# Retraining runs in a background worker process (see jobs.py)
+RETRAIN_EPOCHS = 20
+# Full fine-tune batch size. Small batches force updates on every few images;
+# raise it on machines with more cores for higher throughput.
+TRAIN_BATCH_SIZE = 4
+RETRAIN_STATUS_FILE = os.path.join(BASE_DIR, 'retrain_status.json')
+RETRAIN_CANCEL_FILE = os.path.join(BASE_DIR, 'retrain_job.cancel')
+# The worker writes its pid and a heartbeat into the status file, so a job whose
+# worker died (even before the app restarted) is marked failed instead of running forever
+RETRAIN_HEARTBEAT_SECONDS = 10
+RETRAIN_HEARTBEAT_TIMEOUT = 60   # No heartbeat for this long: the worker is gone
+RETRAIN_STARTUP_TIMEOUT = 120    # Queued jobs whose worker never reported its pid
+
+# 'head' trains only the classifier on cached backbone embeddings (seconds on CPU),
+# 'full' fine-tunes every layer on augmented images (slow, but can fix the backbone)
+RETRAIN_MODES = ['head', 'full']
+DEFAULT_RETRAIN_MODE = 'head'
+HEAD_EPOCHS = 50
+FEATURE_CACHE_DIR = os.path.join(BASE_DIR, 'feature_cache')
+
+# Replay buffer: how many already-learned corrections are mixed into each retrain
+REPLAY_BUFFER_SIZE = 200
+
+# Post-training quantized export for CPU kiosks (see export.py)
+EXPORT_AFTER_RETRAIN = True
+EXPORT_QUANTIZATION = 'float16'  # 'float16' (safe, ~2x smaller) or 'int8' (smallest, fastest)
+TFLITE_FILE = os.path.join(BASE_DIR, 'orange_quality_model.tflite')
+EXPORT_REPORT_FILE = os.path.join(BASE_DIR, 'orange_quality_model.export.json')
+PARITY_SAMPLE_SIZE = 64    # Real images compared against the float model
+PARITY_MIN_REAL_SAMPLES = 16  # Fewer real images than this: 'auto' keeps serving the .h5 model
+CALIBRATION_SAMPLE_SIZE = 100  # int8 calibration images (never the same ones as the parity set)
+PARITY_TOLERANCE = 0.05    # Max allowed difference in rot probability
+PARITY_MIN_AGREEMENT = 0.98  # Share of images that must get the same fresh/rotten call
+
+# 'keras' always runs the .h5 model, 'tflite' prefers the exported artifact,
+# 'auto' uses the artifact only if it passed parity on real images for the current model version.
+INFERENCE_BACKEND = 'auto'
+
+# Inference benchmarks (see benchmark.py). Results are kept as JSON so every
+# retrain leaves a comparable latency record behind.
+BENCHMARK_DIR = os.path.join(BASE_DIR, 'benchmarks')
+BENCHMARK_AFTER_RETRAIN = True
+
+# Headless HTTP inference API for conveyor cameras (see server.py)
+DEFAULT_QUALITY_THRESHOLD = 75  # Same default as the sidebar slider
+SERVER_MAX_BATCH_SIZE = INFERENCE_BATCH_SIZE
+SERVER_MAX_WAIT_MS = 10  # How long the first request in a batch waits for company
+
+# Preprocessing: 'bilinear' is much cheaper than 'lanczos' at 224x224 with no
+# measurable accuracy loss (check with: python benchmark.py --parity).
+# JPEG_DRAFT lets the decoder work at reduced size for large camera frames.
+PREPROCESS_RESAMPLE = 'bilinear'
+JPEG_DRAFT = True
@@ -0,0 +1,54 @@
+import tensorflow as tf
+
+from config import IMAGE_SIZE, TRAIN_BATCH_SIZE
+
+AUTOTUNE = tf.data.AUTOTUNE
+
+# Same augmentation as the old ImageDataGenerator settings
+# (rotation_range=20, width/height shift 0.2, horizontal flip, nearest fill),
+# but as graph ops that run on whole batches in parallel.
+_augment = tf.keras.Sequential([
+    tf.keras.layers.RandomRotation(20 / 360, fill_mode='nearest'),
+    tf.keras.layers.RandomTranslation(0.2, 0.2, fill_mode='nearest'),
+    tf.keras.layers.RandomFlip('horizontal'),
+])
+
+# Center-crop to the target aspect ratio then resize, like ImageOps.fit at inference
+_resize = tf.keras.layers.Resizing(IMAGE_SIZE[1], IMAGE_SIZE[0], crop_to_aspect_ratio=True)
+
+
+def _decode(path, label):
+    """Reads and decodes one image file into a float32 (H, W, 3) tensor in 0..255."""
+    raw = tf.io.read_file(path)
+    image = tf.io.decode_image(raw, channels=3, expand_animations=False)
+    image = _resize(tf.cast(image, tf.float32))
+    return image, label
+
+
+def _augment_batch(images, labels):
+    return _augment(images, training=True), labels
+
+
+def _preprocess_batch(images, labels):
+    # Same scaling as inference (MobileNetV2 expects -1..1)
+    return tf.keras.applications.mobilenet_v2.preprocess_input(images), labels
+
+
+def build_training_dataset(paths, labels, batch_size=TRAIN_BATCH_SIZE, augment=True, cache=True):
+    """
+    Streaming input pipeline for retraining.
+
+    Files are decoded in parallel, optionally cached as decoded tensors (in memory)
+    so later epochs skip JPEG decoding, then augmented per batch and prefetched
+    so the CPU prepares the next batch while the model trains on the current one.
+    """
+    dataset = tf.data.Dataset.from_tensor_slices((list(paths), [float(label) for label in labels]))
+    dataset = dataset.map(_decode, num_parallel_calls=AUTOTUNE)
+    if cache:
+        dataset = dataset.cache()
+    dataset = dataset.shuffle(buffer_size=max(len(paths), 1), reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    if augment:
+        dataset = dataset.map(_augment_batch, num_parallel_calls=AUTOTUNE)
+    dataset = dataset.map(_preprocess_batch, num_parallel_calls=AUTOTUNE)
+    return dataset.prefetch(AUTOTUNE)
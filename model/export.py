@@ -0,0 +1,138 @@
+import json
+import os
+import random
+import time
+
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+
+from config import (
+    TFLITE_FILE, EXPORT_REPORT_FILE, EXPORT_QUANTIZATION, PARITY_SAMPLE_SIZE,
+    PARITY_MIN_REAL_SAMPLES, CALIBRATION_SAMPLE_SIZE, PARITY_TOLERANCE, PARITY_MIN_AGREEMENT, IMAGE_SIZE,
+)
+from inference import TFLiteModel, read_model_version
+from preprocessing import preprocess_batch
+
+
+def _write_atomic(path, data, mode='wb'):
+    tmp_file = path + '.tmp'
+    with open(tmp_file, mode) as f:
+        f.write(data)
+    os.replace(tmp_file, path)
+
+
+def convert_to_tflite(model, quantization=EXPORT_QUANTIZATION, calibration_batch=None):
+    """
+    Post-training quantization of the Keras model into a TFLite flatbuffer.
+    int8 needs a calibration batch (preprocessed images) to pick activation ranges.
+    Inputs and outputs stay float32 so the preprocessing path does not change.
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        if calibration_batch is None or len(calibration_batch) == 0:
+            raise ValueError("int8 quantization needs calibration images")
+
+        def representative_dataset():
+            for image in calibration_batch:
+                yield [image[np.newaxis, ...]]
+
+        converter.representative_dataset = representative_dataset
+    else:
+        raise ValueError(f"Unknown quantization: {quantization}")
+
+    return converter.convert()
+
+
+def parity_check(model, tflite_model, batch):
+    """Compares rot probabilities of the float model and the exported artifact."""
+    expected = np.asarray(model.predict(batch, verbose=0))[:, 0]
+    actual = tflite_model.predict(batch)[:, 0]
+    diff = np.abs(expected - actual)
+    agreement = float(np.mean((expected >= 0.5) == (actual >= 0.5)))
+    return {
+        'samples': int(len(batch)),
+        'max_abs_diff': float(diff.max()),
+        'mean_abs_diff': float(diff.mean()),
+        'decision_agreement': agreement,
+        'passed': bool(diff.max() <= PARITY_TOLERANCE and agreement >= PARITY_MIN_AGREEMENT),
+    }
+
+
+def _noise_batch(count, seed):
+    rng = np.random.default_rng(seed)
+    return preprocess_batch([
+        Image.fromarray(rng.integers(0, 256, (IMAGE_SIZE[1], IMAGE_SIZE[0], 3), dtype=np.uint8))
+        for _ in range(count)
+    ])
+
+
+def load_export_batches(paths, seed=0):
+    """
+    Preprocessed (calibration batch, parity batch, real parity images?) from
+    two disjoint random samples of the given images, so int8 ranges are never
+    fitted on the images they are checked against.
+    Falls back to synthetic noise images while there are too few real ones;
+    such an export is reported with real_holdout=False and 'auto' ignores it.
+    """
+    paths = list(paths)
+    random.Random(seed).shuffle(paths)
+    parity_paths = paths[:min(PARITY_SAMPLE_SIZE, len(paths) // 2)]
+    calibration_paths = paths[len(parity_paths):len(parity_paths) + CALIBRATION_SAMPLE_SIZE]
+    real_holdout = len(parity_paths) >= PARITY_MIN_REAL_SAMPLES
+
+    if real_holdout:
+        parity = preprocess_batch([Image.open(path) for path in parity_paths])
+    else:
+        parity = _noise_batch(8, seed)
+    if calibration_paths:
+        calibration = preprocess_batch([Image.open(path) for path in calibration_paths])
+    else:
+        calibration = _noise_batch(8, seed + 1)
+    return calibration, parity, real_holdout
+
+
+def export_model(model, image_paths, quantization=EXPORT_QUANTIZATION):
+    """
+    Exports the model, checks it against the float model and publishes it.
+    image_paths are real inspection images (e.g. every stored correction);
+    parity only compares the two models, so images seen in training are fine.
+    The artifact is only written when parity passes; the report always is, so
+    the inspector knows whether the artifact matches the current model version.
+    """
+    calibration, parity, real_holdout = load_export_batches(image_paths)
+    started = time.perf_counter()
+    flatbuffer = convert_to_tflite(model, quantization, calibration_batch=calibration)
+    tflite_model = TFLiteModel(model_content=flatbuffer)
+
+    report = parity_check(model, tflite_model, parity)
+    report.update(
+        model_version=read_model_version(),
+        quantization=quantization,
+        size_bytes=len(flatbuffer),
+        real_holdout=real_holdout,
+        calibration_samples=int(len(calibration)) if quantization == 'int8' else 0,
+        export_seconds=round(time.perf_counter() - started, 2),
+        exported_at=time.time(),
+    )
+    if report['passed']:
+        _write_atomic(TFLITE_FILE, flatbuffer)
+    _write_atomic(EXPORT_REPORT_FILE, json.dumps(report, indent=2), mode='w')
+    return report
+
+
+if __name__ == '__main__':
+    # Manual export of the current model: python export.py [float16|int8]
+    import sys
+    from tensorflow.keras.models import load_model
+    from config import MODEL_FILE
+    from feedback_store import FeedbackStore
+
+    store = FeedbackStore()
+    images = list(dict.fromkeys(store.object_path(e['hash']) for e in store.entries()))
+    quantization = sys.argv[1] if len(sys.argv) > 1 else EXPORT_QUANTIZATION
+    print(json.dumps(export_model(load_model(MODEL_FILE), images, quantization), indent=2))
@@ -0,0 +1,101 @@
+import hashlib
+import os
+import shutil
+
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+
+from config import FEATURE_CACHE_DIR, PREPROCESS_RESAMPLE
+from preprocessing import preprocess_batch
+
+# Trailing layers that make up the classifier head. Everything before them
+# (MobileNetV2 + pooling) is the frozen backbone whose output we cache.
+HEAD_LAYER_TYPES = (
+    tf.keras.layers.Dense,
+    tf.keras.layers.Dropout,
+    tf.keras.layers.BatchNormalization,
+)
+
+
+def file_hash(path):
+    """SHA-256 of the file contents. Same picture -> same key, whatever its filename."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def split_model(model):
+    """
+    Splits the quality model into (backbone, head_layers).
+    The backbone maps an image to a flat embedding; the head layers map that
+    embedding to the rot probability.
+    """
+    split = len(model.layers)
+    while split > 0 and isinstance(model.layers[split - 1], HEAD_LAYER_TYPES):
+        split -= 1
+    if split == 0 or split == len(model.layers):
+        raise ValueError("Could not find a classifier head at the end of the model")
+
+    backbone = tf.keras.Model(model.inputs, model.layers[split - 1].output)
+    if len(backbone.output.shape) != 2:
+        raise ValueError(f"Backbone output must be a flat embedding, got {backbone.output.shape}")
+    return backbone, model.layers[split:]
+
+
+def backbone_fingerprint(backbone):
+    """Hash of the backbone weights (and resize filter). A full fine-tune changes it and retires old embeddings."""
+    digest = hashlib.sha1(PREPROCESS_RESAMPLE.encode())  # Embeddings also depend on the resize filter
+    for weight in backbone.weights:
+        digest.update(np.asarray(weight).tobytes())
+    return digest.hexdigest()[:16]
+
+
+class FeatureCache:
+    """
+    On-disk store of backbone embeddings, one small float16 .npy per image.
+
+    Each entry holds two views (original + horizontal flip) so the head still
+    sees a little augmentation. Entries live in a folder named after the
+    backbone fingerprint, so embeddings from an older backbone are never reused.
+    """
+
+    def __init__(self, backbone, cache_dir=FEATURE_CACHE_DIR):
+        self.backbone = backbone
+        self.fingerprint = backbone_fingerprint(backbone)
+        self.root = cache_dir
+        self.cache_dir = os.path.join(cache_dir, self.fingerprint)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def prune_stale(self):
+        """Deletes embeddings computed by previous backbones."""
+        for name in os.listdir(self.root):
+            if name != self.fingerprint:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def embed(self, paths, batch_size=32):
+        """
+        Returns an array of shape (len(paths), 2, dim) with the cached embeddings.
+        Only images never seen by this backbone go through the network.
+        """
+        keys = [file_hash(path) for path in paths]
+        missing = [i for i, key in enumerate(keys) if not os.path.exists(self._entry_path(key))]
+
+        for start in range(0, len(missing), batch_size):
+            chunk = missing[start:start + batch_size]
+            batch = preprocess_batch([Image.open(paths[i]) for i in chunk])
+            # The crop is centered, so mirroring the preprocessed pixels equals preprocessing a mirrored image
+            batch = np.concatenate([batch, batch[:, :, ::-1, :]])
+            features = self.backbone.predict(batch, verbose=0)
+            for j, i in enumerate(chunk):
+                entry = np.stack([features[j], features[j + len(chunk)]]).astype(np.float16)
+                tmp_file = self._entry_path(keys[i]) + '.tmp.npy'
+                np.save(tmp_file, entry)
+                os.replace(tmp_file, self._entry_path(keys[i]))
+
+        return np.stack([np.load(self._entry_path(key)) for key in keys]).astype(np.float32)
@@ -0,0 +1,168 @@
+import hashlib
+import io
+import json
+import os
+import random
+import threading
+import time
+
+from PIL import Image
+
+from config import NEW_DATA_DIR, CLASSES, REPLAY_BUFFER_SIZE
+
+
+class FeedbackStore:
+    """
+    Append-only, content-addressed store for operator corrections.
+
+    - Images are saved once under objects/<hash[:2]>/<hash>.jpg, named by the
+      SHA-256 of their JPEG bytes, so concurrent submissions never collide.
+    - manifest.jsonl gets one line per correction (label, timestamp, model
+      version, predicted score). Lines are only ever appended.
+    - trained.json holds a watermark: how many manifest lines the last
+      published model has already learned from. Everything after it is pending.
+
+    Nothing is deleted after training; old corrections stay available to the
+    replay buffer so the model does not forget them.
+    """
+
+    def __init__(self, root=NEW_DATA_DIR):
+        self.root = root
+        self.manifest_file = os.path.join(root, 'manifest.jsonl')
+        self.watermark_file = os.path.join(root, 'trained.json')
+        self.objects_dir = os.path.join(root, 'objects')
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries = []
+        self._offset = 0 # How far into the manifest we have already parsed
+
+    # --- WRITING ---
+
+    def _write_object(self, data):
+        key = hashlib.sha256(data).hexdigest()
+        folder = os.path.join(self.objects_dir, key[:2])
+        path = os.path.join(folder, f"{key}.jpg")
+        if not os.path.exists(path):
+            os.makedirs(folder, exist_ok=True)
+            tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_file, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_file, path)
+        return key
+
+    def _append(self, entry):
+        line = (json.dumps(entry) + '\n').encode('utf-8')
+        # O_APPEND + a single small write keeps concurrent appends from interleaving
+        fd = os.open(self.manifest_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def add(self, image, label, model_version=None, predicted_score=None, timestamp=None):
+        """Stores a corrected image and records it in the manifest. Returns the manifest entry."""
+        if label not in CLASSES:
+            raise ValueError(f"Unknown label: {label}")
+        buffer = io.BytesIO()
+        image.convert('RGB').save(buffer, format='JPEG', quality=95)
+        entry = {
+            'hash': self._write_object(buffer.getvalue()),
+            'label': label,
+            'timestamp': timestamp if timestamp is not None else time.time(),
+            'model_version': model_version,
+            'predicted_score': None if predicted_score is None else float(predicted_score),
+        }
+        self._append(entry)
+        return entry
+
+    def import_legacy_folders(self):
+        """
+        One-off migration: moves images from the old new_data/<label>/ folders
+        into the store. They were never trained on, so they arrive as pending.
+        """
+        imported = 0
+        for label in CLASSES:
+            folder = os.path.join(self.root, label)
+            if not os.path.isdir(folder):
+                continue
+            for name in sorted(os.listdir(folder)):
+                path = os.path.join(folder, name)
+                try:
+                    with Image.open(path) as image:
+                        self.add(image, label, timestamp=os.path.getmtime(path))
+                    imported += 1
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass # Already removed by another process running the migration
+                except OSError:
+                    continue # Not an image (or gone / unreadable); leave it alone
+        return imported
+
+    def mark_trained(self, upto):
+        """Moves the watermark: the first `upto` manifest entries are now part of the model."""
+        tmp_file = self.watermark_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({'trained_upto': upto, 'updated_at': time.time()}, f)
+        os.replace(tmp_file, self.watermark_file)
+
+    # --- READING ---
+
+    def entries(self):
+        """All manifest entries. Only lines appended since the last call are parsed."""
+        with self._lock:
+            try:
+                size = os.path.getsize(self.manifest_file)
+            except FileNotFoundError:
+                return []
+            if size > self._offset:
+                with open(self.manifest_file, 'rb') as f:
+                    f.seek(self._offset)
+                    chunk = f.read(size - self._offset)
+                # Ignore a trailing partial line; it gets picked up next time
+                complete = chunk[:chunk.rfind(b'\n') + 1]
+                for line in complete.splitlines():
+                    if line.strip():
+                        self._entries.append(json.loads(line))
+                self._offset += len(complete)
+            return list(self._entries)
+
+    def trained_upto(self):
+        try:
+            with open(self.watermark_file) as f:
+                return json.load(f)['trained_upto']
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return 0
+
+    def pending_count(self):
+        """How many corrections the current model has not learned yet (no directory scans)."""
+        return max(len(self.entries()) - self.trained_upto(), 0)
+
+    def object_path(self, key):
+        return os.path.join(self.objects_dir, key[:2], f"{key}.jpg")
+
+    def sample_training_set(self, replay_size=REPLAY_BUFFER_SIZE, seed=None):
+        """
+        Builds a training set: every pending correction plus a random replay
+        sample of at most `replay_size` historical ones.
+
+        Returns (upto, paths, labels). Pass `upto` to mark_trained() once the
+        model is published; corrections added meanwhile stay pending.
+        """
+        entries = self.entries()
+        upto = len(entries)
+        watermark = min(self.trained_upto(), upto)
+
+        # If the same picture was corrected twice, the latest label wins
+        pending = {e['hash']: e for e in entries[watermark:upto]}
+        history = {e['hash']: e for e in entries[:watermark] if e['hash'] not in pending}
+
+        replay = list(history.values())
+        if len(replay) > replay_size:
+            replay = random.Random(seed).sample(replay, replay_size)
+
+        selected = list(pending.values()) + replay
+        paths = [self.object_path(e['hash']) for e in selected]
+        labels = [CLASSES.index(e['label']) for e in selected]
+        return upto, paths, labels
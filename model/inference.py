@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.models import load_model
+
+from config import (
+    MODEL_FILE, MODEL_VERSION_FILE, INFERENCE_BATCH_SIZE, INFERENCE_BACKEND,
+    TFLITE_FILE, EXPORT_REPORT_FILE,
+)
+
+
+def _file_signature(path):
+    """Cheap fingerprint of a file (mtime + size). One stat call, no reading."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def read_model_version():
+    """Returns the published model version counter (0 if nothing was published yet)."""
+    try:
+        with open(MODEL_VERSION_FILE) as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def read_export_report():
+    """Returns the report of the last quantized export, or None if nothing was exported yet."""
+    try:
+        with open(EXPORT_REPORT_FILE) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def publish_model(model):
+    """
+    Saves a trained model so running inspectors pick it up safely.
+    We write to a temporary file first and then swap it in with os.replace,
+    so a reader never sees a half-written .h5 file.
+    """
+    tmp_file = MODEL_FILE.replace('.h5', '.tmp.h5')
+    model.save(tmp_file)
+    os.replace(tmp_file, MODEL_FILE)
+
+    version = read_model_version() + 1
+    tmp_version = MODEL_VERSION_FILE + '.tmp'
+    with open(tmp_version, 'w') as f:
+        f.write(str(version))
+    os.replace(tmp_version, MODEL_VERSION_FILE)
+    return version
+
+
+class TFLiteModel:
+    """
+    Small wrapper that gives a TFLite interpreter the same predict() call as a Keras model.
+    The interpreter is not thread-safe, so calls are serialized.
+    """
+
+    def __init__(self, model_path=None, model_content=None):
+        self.interpreter = tf.lite.Interpreter(
+            model_path=model_path, model_content=model_content, num_threads=os.cpu_count()
+        )
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self.input_shape = tuple(self._input['shape'])
+        self._batch = self.input_shape[0]
+        self._lock = threading.Lock()
+
+    def predict(self, batch, batch_size=None, verbose=0):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            if len(batch) != self._batch:
+                # Resizing re-plans the tensors, so we only do it when the batch size changes
+                self.interpreter.resize_tensor_input(self._input['index'], (len(batch),) + batch.shape[1:])
+                self.interpreter.allocate_tensors()
+                self._batch = len(batch)
+            self.interpreter.set_tensor(self._input['index'], batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output['index']).copy()
+
+
+def _tflite_is_current():
+    """True if the exported artifact passed parity on real images for the model version being served."""
+    report = read_export_report()
+    return (
+        report is not None
+        and report.get('passed')
+        and report.get('real_holdout')  # noise images only prove the converter ran
+        and report.get('model_version') == read_model_version()
+        and os.path.exists(TFLITE_FILE)
+    )
+
+
+class InferenceEngine:
+    """
+    Long-lived holder for the quality model.
+
+    The model is deserialized once and kept in memory. Before every prediction we
+    only stat() the model files; if retraining published a new one, it is loaded
+    on the side and swapped in atomically, so callers never see a half-loaded model.
+
+    backend picks what gets served: 'keras' (.h5), 'tflite' (quantized export when
+    one exists) or 'auto' (quantized export only if it passed parity on real images for this version).
+    """
+
+    def __init__(self, model_file=MODEL_FILE, backend=INFERENCE_BACKEND):
+        self.model_file = model_file
+        self.backend = backend
+        self._model = None
+        self._signature = None
+        self.version = 0
+        self.active_backend = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+    def _signature_now(self):
+        # The version file is written after the .h5, so it is part of the signature:
+        # a reload that raced with publish_model is redone once the version lands
+        signature = (_file_signature(self.model_file), _file_signature(MODEL_VERSION_FILE))
+        if self.backend != 'keras':
+            signature += (_file_signature(TFLITE_FILE), _file_signature(EXPORT_REPORT_FILE))
+        return signature
+
+    def _load(self):
+        use_tflite = (
+            (self.backend == 'tflite' and os.path.exists(TFLITE_FILE))
+            or (self.backend == 'auto' and _tflite_is_current())
+        )
+        if use_tflite:
+            model, kind = TFLiteModel(model_path=TFLITE_FILE), 'tflite'
+            input_shape = (1,) + model.input_shape[1:]
+        else:
+            model, kind = load_model(self.model_file, compile=False), 'keras'
+            input_shape = (1,) + tuple(model.input_shape[1:])
+        # Build the predict graph now so the first real inspection is not slow
+        model.predict(np.zeros(input_shape, dtype=np.float32), verbose=0)
+        return model, kind
+
+    def get_model(self):
+        """Returns the in-memory model, hot-swapping it if the files on disk changed."""
+        signature = self._signature_now()
+        if self._model is not None and signature == self._signature:
+            return self._model
+
+        # Only one thread reloads. While it does, the others keep serving the old model
+        # instead of queueing up behind a multi-second deserialization.
+        if not self._reload_lock.acquire(blocking=self._model is None):
+            return self._model
+        try:
+            # Another thread may have reloaded while we were waiting for the lock
+            if self._model is not None and signature == self._signature:
+                return self._model
+            version = read_model_version()
+            new_model, kind = self._load()  # slow, so outside the swap lock
+            with self._lock:
+                # Swap in one step: readers either get the old or the new model
+                self._model, self._signature = new_model, signature
+                self.active_backend = kind
+                self.version = version
+            return new_model
+        finally:
+            self._reload_lock.release()
+
+    def predict(self, batch, batch_size=INFERENCE_BATCH_SIZE):
+        """Runs the forward pass on an already preprocessed batch. Returns rot probabilities."""
+        model = self.get_model()
+        prediction = model.predict(batch, batch_size=batch_size, verbose=0)
+        return np.asarray(prediction)[:, 0]
@@ -0,0 +1,193 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from config import (
+    BASE_DIR, RETRAIN_STATUS_FILE, RETRAIN_CANCEL_FILE, BENCHMARK_AFTER_RETRAIN,
+    RETRAIN_HEARTBEAT_SECONDS, RETRAIN_HEARTBEAT_TIMEOUT, RETRAIN_STARTUP_TIMEOUT,
+)
+
+# Job states written to the status file
+QUEUED, RUNNING, COMPLETED, CANCELLED, FAILED = 'queued', 'running', 'completed', 'cancelled', 'failed'
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+def _write_status(status):
+    """Atomically replaces the status file so readers never see half a JSON document."""
+    tmp_file = RETRAIN_STATUS_FILE + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(status, f)
+    os.replace(tmp_file, RETRAIN_STATUS_FILE)
+
+
+def read_status():
+    """Returns the last known job status, or None if no job ever ran."""
+    try:
+        with open(RETRAIN_STATUS_FILE) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Someone else's process reused the pid; the heartbeat decides
+    return True
+
+
+def worker_alive(status):
+    """
+    True while the worker of an active job can still be running.
+    Only uses what the worker wrote into the status file (pid, heartbeat),
+    so it also works after the app that started the job was restarted.
+    """
+    now = time.time()
+    if status.get('pid') is None:
+        # Queued: the worker process has not reported in yet
+        return now - status.get('started_at', now) < RETRAIN_STARTUP_TIMEOUT
+    return (_pid_alive(status['pid'])
+            and now - status.get('heartbeat_at', 0) < RETRAIN_HEARTBEAT_TIMEOUT)
+
+
+class RetrainJobManager:
+    """
+    Runs retraining in a separate Python process so the inspection UI keeps working.
+
+    The worker reports progress through a small JSON status file, and a cancel is
+    requested by dropping a flag file the worker polls after every batch.
+    The current model keeps serving until the worker publishes a new one.
+    """
+
+    def __init__(self):
+        self._process = None
+        self._lock = threading.Lock()
+
+    def start(self, **options):
+        """Starts a retraining job unless one with a live worker is active. Returns its status."""
+        with self._lock:
+            status = self.status()  # marks a job whose worker is gone as failed
+            if status and status['state'] in ACTIVE_STATES:
+                return status
+
+            if os.path.exists(RETRAIN_CANCEL_FILE):
+                os.remove(RETRAIN_CANCEL_FILE)
+
+            status = {
+                'job_id': uuid.uuid4().hex,
+                'state': QUEUED,
+                'progress': 0,
+                'message': 'Waiting for worker...',
+                'options': options,
+                'started_at': time.time(),
+                'finished_at': None,
+                'model_version': None,
+            }
+            _write_status(status)
+            self._process = subprocess.Popen(
+                [sys.executable, os.path.join(BASE_DIR, 'jobs.py'), status['job_id']],
+                cwd=BASE_DIR,
+            )
+            return status
+
+    def _is_dead(self, status):
+        if self._process is not None and self._process.poll() is not None:
+            # Our own worker exited (poll() also reaps it, so its pid stops answering)
+            if status.get('pid') in (None, self._process.pid):
+                return True
+        return not worker_alive(status)
+
+    def status(self):
+        """Returns the current job status, marking it failed if the worker died silently."""
+        status = read_status()
+        if status and status['state'] in ACTIVE_STATES and self._is_dead(status):
+            # The worker exited without writing a final state (crash, OOM kill, app restart...)
+            status = read_status()
+            if status['state'] in ACTIVE_STATES and self._is_dead(status):
+                status.update(state=FAILED, message='Worker exited unexpectedly', finished_at=time.time())
+                _write_status(status)
+        return status
+
+    def cancel(self):
+        """Asks the running job to stop. The current model stays in service."""
+        status = self.status()
+        if status and status['state'] in ACTIVE_STATES:
+            open(RETRAIN_CANCEL_FILE, 'w').close()
+            return True
+        return False
+
+
+def _benchmark_new_model(status):
+    """Quick latency record for the freshly published model. Never fails the job."""
+    from benchmark import run_benchmark
+    try:
+        results = run_benchmark(iterations=20)
+        status['regressions'] = results.get('regressions', [])
+    except Exception as e:
+        status['regressions'] = [f'Benchmark failed: {e}']
+
+
+def _train(options, progress, should_stop):
+    """Runs the retraining and returns the final status fields."""
+    # Heavy imports happen here, inside the worker process only
+    from trainer import retrain_brain, TrainingCancelled
+
+    try:
+        version = retrain_brain(progress=progress, should_stop=should_stop, **options)
+    except TrainingCancelled as e:
+        return {'state': CANCELLED, 'message': str(e)}
+    if version is None:
+        return {'state': COMPLETED, 'message': 'No data found to train on!'}
+    outcome = {'state': COMPLETED, 'progress': 100, 'message': 'Model Updated Successfully!', 'model_version': version}
+    if BENCHMARK_AFTER_RETRAIN:
+        _benchmark_new_model(outcome)
+    return outcome
+
+
+def _run_job(job_id):
+    """Worker entry point: runs one retraining job and keeps the status file up to date."""
+    status = read_status() or {'job_id': job_id, 'options': {}}
+    lock = threading.Lock()  # progress and heartbeat write from different threads
+
+    def save(**changes):
+        with lock:
+            status.update(changes, heartbeat_at=time.time())
+            _write_status(status)
+
+    # pid and heartbeat first: loading TensorFlow below takes a while
+    save(state=RUNNING, progress=0, message='Starting...', pid=os.getpid())
+    stopped = threading.Event()
+
+    def heartbeat():
+        while not stopped.wait(RETRAIN_HEARTBEAT_SECONDS):
+            save()
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+
+    def progress(percent, text):
+        save(progress=percent, message=text)
+
+    def should_stop():
+        return os.path.exists(RETRAIN_CANCEL_FILE)
+
+    outcome = {}
+    try:
+        outcome = _train(status['options'], progress, should_stop)
+    except Exception as e:
+        outcome = {'state': FAILED, 'message': f'Training failed: {e}'}
+    finally:
+        stopped.set()
+        save(finished_at=time.time(), **outcome)
+        if os.path.exists(RETRAIN_CANCEL_FILE):
+            os.remove(RETRAIN_CANCEL_FILE)
+
+
+if __name__ == '__main__':
+    _run_job(sys.argv[1])
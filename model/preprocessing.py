@@ -0,0 +1,132 @@
+import io
+import math
+import os
+import zipfile
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from config import IMAGE_SIZE, PREPROCESS_RESAMPLE, JPEG_DRAFT
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+RESAMPLE_FILTERS = {
+    'nearest': Image.Resampling.NEAREST,
+    'bilinear': Image.Resampling.BILINEAR,
+    'bicubic': Image.Resampling.BICUBIC,
+    'lanczos': Image.Resampling.LANCZOS,
+}
+
+
+def _center_crop_box(width, height, size):
+    """Same centered crop ImageOps.fit uses, as a (left, top, right, bottom) float box."""
+    target_ratio = size[0] / size[1]
+    if width / height > target_ratio:
+        crop_w, crop_h = height * target_ratio, height
+    else:
+        crop_w, crop_h = width, width / target_ratio
+    left, top = (width - crop_w) / 2, (height - crop_h) / 2
+    return (left, top, left + crop_w, top + crop_h)
+
+
+def _draft(image, size):
+    """
+    Lets the JPEG decoder skip work: it decodes at 1/2, 1/4 or 1/8 scale as long
+    as the centered crop stays at least twice the target size (for clean downscaling).
+    Only has an effect on JPEGs that have not been decoded yet.
+    """
+    if image.format != 'JPEG':
+        return
+    width, height = image.size
+    shrink = min(width / size[0], height / size[1]) / 2
+    if shrink > 1:
+        image.draft('RGB', (math.ceil(width / shrink), math.ceil(height / shrink)))
+
+
+def fit_image_into(image, out, size=IMAGE_SIZE, resample=PREPROCESS_RESAMPLE):
+    """
+    Center-crops and resizes one PIL image straight into `out`, a float32
+    (H, W, 3) slice of a batch buffer. Crop and resize happen in a single
+    Image.resize call, so there is no intermediate cropped copy.
+    """
+    if JPEG_DRAFT:
+        _draft(image, size)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    box = _center_crop_box(image.width, image.height, size)
+    resized = image.resize(size, RESAMPLE_FILTERS[resample], box=box)
+    out[...] = np.asarray(resized)
+
+
+def preprocess_batch(images, size=IMAGE_SIZE, out=None):
+    """
+    Turns a list of PIL images into ONE float32 tensor ready for model.predict.
+
+    Every image is written straight into a preallocated buffer (pass `out` to
+    reuse one across calls), then scaled to -1..1 in place, exactly like
+    mobilenet_v2.preprocess_input but without the extra full-batch copies.
+    Open images lazily (no .convert()) so JPEG draft decoding can kick in.
+    """
+    if out is None:
+        out = np.empty((len(images), size[1], size[0], 3), dtype=np.float32)
+    batch = out[:len(images)]
+    for i, image in enumerate(images):
+        fit_image_into(image, batch[i], size)
+    batch /= 127.5
+    batch -= 1.0
+    return batch
+
+
+def reference_preprocess_batch(images, size=IMAGE_SIZE):
+    """The original inspector path (LANCZOS fit + Keras preprocess_input), kept for parity checks."""
+    import tensorflow as tf
+
+    arrays = [np.array(ImageOps.fit(image.convert('RGB'), size, Image.Resampling.LANCZOS)) for image in images]
+    return tf.keras.applications.mobilenet_v2.preprocess_input(np.stack(arrays).astype(np.float32))
+
+
+def check_parity(sources, predict=None):
+    """
+    Compares the fast path against the original one on the same pictures.
+    `sources` are file paths or raw image bytes (each is opened twice, since
+    draft mode changes the image it is applied to). Pixel error is in the
+    -1..1 input scale; with `predict` (batch -> rot probabilities) the
+    quality scores are compared too.
+    """
+    def open_image(source):
+        return Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+    fast = preprocess_batch([open_image(source) for source in sources])
+    reference = reference_preprocess_batch([open_image(source) for source in sources])
+    diff = np.abs(fast - reference)
+    report = {
+        'images': len(sources),
+        'pixel_mean_abs_diff': float(diff.mean()),
+        'pixel_max_abs_diff': float(diff.max()),
+    }
+    if predict is not None:
+        score_diff = np.abs(np.asarray(predict(fast)) - np.asarray(predict(reference))) * 100
+        report['score_max_abs_diff'] = float(score_diff.max())
+        report['score_mean_abs_diff'] = float(score_diff.mean())
+    return report
+
+
+def iter_zip_images(file):
+    """
+    Yields (filename, PIL image) for every picture inside an uploaded .zip archive.
+    image is None when an entry can't be read (bad CRC, not really an image).
+    """
+    with zipfile.ZipFile(file) as archive:
+        for name in sorted(archive.namelist()):
+            if name.endswith('/') or not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            # Skip macOS resource forks like __MACOSX/._photo.jpg
+            if os.path.basename(name).startswith('._'):
+                continue
+            try:
+                with archive.open(name) as f:
+                    # Kept undecoded so preprocessing can use JPEG draft mode
+                    image = Image.open(io.BytesIO(f.read()))
+            except Exception:
+                image = None
+            yield name, image
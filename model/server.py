@@ -0,0 +1,142 @@
+"""
+Headless HTTP inference API for the fruit quality model.
+
+    uvicorn server:app --host 0.0.0.0 --port 8500
+
+Cameras POST the raw image bytes to /predict. Requests arriving at the same
+time are coalesced by a micro-batcher into a single model.predict call, so
+many cameras can share one model process.
+"""
+import asyncio
+import io
+from contextlib import asynccontextmanager
+
+import numpy as np
+from fastapi import FastAPI, HTTPException, Query, Request
+from PIL import Image, UnidentifiedImageError
+from starlette.concurrency import run_in_threadpool
+
+from config import DEFAULT_QUALITY_THRESHOLD, SERVER_MAX_BATCH_SIZE, SERVER_MAX_WAIT_MS
+from inference import InferenceEngine
+from preprocessing import preprocess_batch
+
+
+class MicroBatcher:
+    """
+    Collects preprocessed images from concurrent requests and runs them as one batch.
+
+    The first request of a batch waits at most max_wait_ms for others to join;
+    a batch is flushed early as soon as it reaches max_batch_size.
+    """
+
+    def __init__(self, engine, max_batch_size=SERVER_MAX_BATCH_SIZE, max_wait_ms=SERVER_MAX_WAIT_MS):
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._worker = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, array):
+        """Queues one preprocessed (H, W, 3) image and waits for its rot probability."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((array, future))
+        return await future
+
+    async def _collect(self):
+        items = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(items) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _run(self):
+        while True:
+            items = await self._collect()
+            # Drop requests whose client already went away
+            items = [(array, future) for array, future in items if not future.done()]
+            if not items:
+                continue
+            batch = np.stack([array for array, _ in items])
+            try:
+                # The forward pass runs off the event loop so new requests keep queueing
+                rot_probs = await run_in_threadpool(self.engine.predict, batch, len(batch))
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), rot_prob in zip(items, rot_probs):
+                if not future.done():
+                    future.set_result(float(rot_prob))
+
+
+engine = InferenceEngine()
+batcher = MicroBatcher(engine)
+
+
+@asynccontextmanager
+async def life_span(app: FastAPI):
+    """Loads the model before the first camera connects and runs the batching loop."""
+    await run_in_threadpool(engine.get_model)
+    await batcher.start()
+    yield
+    await batcher.stop()
+
+
+app = FastAPI(title="Smart Fruit Inspector API", lifespan=life_span)
+
+
+def _decode_and_preprocess(data):
+    # Not converted here: preprocessing decodes JPEGs at reduced size
+    image = Image.open(io.BytesIO(data))
+    return preprocess_batch([image])[0]
+
+
+@app.post("/predict")
+async def predict(request: Request, threshold: float = Query(DEFAULT_QUALITY_THRESHOLD, ge=0, le=100)):
+    """Scores one fruit image sent as the raw request body (JPEG or PNG)."""
+    data = await request.body()
+    if not data:
+        raise HTTPException(status_code=400, detail="Request body must contain an image")
+    try:
+        # Decoding and resizing are CPU work; do them in a thread, in parallel across requests
+        array = await run_in_threadpool(_decode_and_preprocess, data)
+    except Image.DecompressionBombError:
+        raise HTTPException(status_code=400, detail="Image has too many pixels to decode")
+    except (UnidentifiedImageError, OSError, ValueError):
+        # same cases the bulk inspection marks as UNREADABLE (unknown format, truncated, odd mode)
+        raise HTTPException(status_code=415, detail="Could not decode image")
+
+    rot_prob = await batcher.submit(array)
+    quality_score = (1.0 - rot_prob) * 100
+    return {
+        "quality_score": round(quality_score, 2),
+        "rot_probability": rot_prob,
+        "passed": quality_score >= threshold,
+        "model_version": engine.version,
+        "backend": engine.active_backend,
+    }
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "model_version": engine.version, "backend": engine.active_backend}
@@ -0,0 +1,166 @@
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.models import load_model
+
+from config import (
+    MODEL_FILE, RETRAIN_EPOCHS, TRAIN_BATCH_SIZE, DEFAULT_RETRAIN_MODE, HEAD_EPOCHS,
+    REPLAY_BUFFER_SIZE, EXPORT_AFTER_RETRAIN,
+)
+from export import export_model
+from data_pipeline import build_training_dataset
+from feature_cache import FeatureCache, split_model
+from feedback_store import FeedbackStore
+from inference import publish_model
+
+
+class TrainingCancelled(Exception):
+    """Raised when an operator cancels a retraining job before it is published."""
+
+
+class _ProgressCallback(tf.keras.callbacks.Callback):
+    """Reports epoch progress and stops training as soon as a cancel is requested."""
+
+    def __init__(self, progress, should_stop, epochs):
+        super().__init__()
+        self.progress = progress
+        self.should_stop = should_stop
+        self.epochs = epochs
+
+    def on_train_batch_end(self, batch, logs=None):
+        if self.should_stop():
+            self.model.stop_training = True
+
+    def on_epoch_end(self, epoch, logs=None):
+        if self.should_stop():
+            # Covers fits too small to have a batch end after the flag appears
+            self.model.stop_training = True
+        done = epoch + 1
+        # Training covers the 40% -> 80% band of the overall progress bar
+        self.progress(40 + int(40 * done / self.epochs), f"Training epoch {done}/{self.epochs}...")
+
+
+def _train_head(model, paths, labels, progress, should_stop):
+    """
+    FAST MODE: only the classifier head learns.
+    Backbone embeddings come from the feature cache, so each image goes
+    through MobileNetV2 once in its lifetime instead of once per epoch.
+    """
+    backbone, head_layers = split_model(model)
+    cache = FeatureCache(backbone)
+    cache.prune_stale()
+
+    progress(30, "Extracting features (cached images are skipped)...")
+    features = cache.embed(paths) # (n, 2 views, dim)
+    n, views, dim = features.shape
+    x = features.reshape(n * views, dim)
+    y = np.repeat(np.asarray(labels, dtype=np.float32), views)
+
+    # The head layers are shared with the full model, so training them here
+    # updates the weights that get published.
+    head = tf.keras.Sequential([tf.keras.Input(shape=(dim,))] + list(head_layers))
+    head.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
+                 loss='binary_crossentropy',
+                 metrics=['accuracy'])
+
+    progress(40, f"Training head ({HEAD_EPOCHS} Epochs)...")
+    head.fit(
+        x, y,
+        epochs=HEAD_EPOCHS,
+        batch_size=32,
+        shuffle=True,
+        verbose=0,
+        callbacks=[_ProgressCallback(progress, should_stop, HEAD_EPOCHS)],
+    )
+
+
+def _train_full(model, paths, labels, progress, should_stop, batch_size):
+    """
+    FULL MODE: every layer learns from heavily augmented images.
+    """
+    # 1. SETUP INPUT PIPELINE (HEAVY AUGMENTATION)
+    # We twist and turn the images so the model sees 'more' data than we actually have
+    dataset = build_training_dataset(paths, labels, batch_size=batch_size)
+
+    # UNFREEZE LAYERS (Allow the brain to change)
+    model.trainable = True
+
+    # HIGH LEARNING RATE (Aggressive Mode)
+    # 0.001 is standard, 0.00001 is gentle. We use 0.001 to force changes.
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
+                  loss='binary_crossentropy',
+                  metrics=['accuracy'])
+
+    # TRAIN LOOP
+    progress(40, f"Training ({RETRAIN_EPOCHS} Epochs)...")
+    model.fit(
+        dataset,
+        epochs=RETRAIN_EPOCHS,
+        verbose=0,
+        callbacks=[_ProgressCallback(progress, should_stop, RETRAIN_EPOCHS)],
+    )
+
+
+def retrain_brain(progress=None, should_stop=None, mode=DEFAULT_RETRAIN_MODE, batch_size=TRAIN_BATCH_SIZE,
+                  replay_size=REPLAY_BUFFER_SIZE):
+    """
+    AGGRESSIVE RETRAINING FUNCTION
+    Forces the model to over-fit on the new data to fix mistakes immediately.
+
+    Runs without any UI so it can live in a background worker.
+    mode is 'head' (classifier only, on cached embeddings) or 'full' (every layer);
+    batch_size only applies to 'full'. Pending corrections are mixed with up to
+    replay_size older ones so the model keeps what it learned before.
+    progress(percent, text) receives status updates, should_stop() is polled
+    after every batch. Returns the published model version, or None if there
+    was nothing to train on. Raises TrainingCancelled if stopped early.
+    """
+    progress = progress or (lambda percent, text: None)
+    should_stop = should_stop or (lambda: False)
+    progress(0, "Initializing training...")
+
+    # Snapshot the feedback index. Corrections submitted while we train
+    # stay pending for the next run.
+    store = FeedbackStore()
+    store.import_legacy_folders()
+    if store.pending_count() == 0:
+        return None
+    upto, used_files, labels = store.sample_training_set(replay_size=replay_size)
+
+    # 1. PREPARE MODEL
+    progress(20, "Loading Neural Network...")
+    model = load_model(MODEL_FILE)
+
+    # 2. TRAIN
+    if mode == 'head':
+        _train_head(model, used_files, labels, progress, should_stop)
+    elif mode == 'full':
+        _train_full(model, used_files, labels, progress, should_stop, batch_size)
+    else:
+        raise ValueError(f"Unknown retrain mode: {mode}")
+
+    if should_stop():
+        # Never publish a half-trained model; the current one keeps serving
+        raise TrainingCancelled("Retraining cancelled by operator")
+
+    # 3. SAVE
+    progress(80, "Saving new intelligence...")
+    version = publish_model(model) # Atomic swap: the inspector hot-loads it on the next prediction
+
+    # 4. QUANTIZED EXPORT (for CPU kiosks)
+    if EXPORT_AFTER_RETRAIN:
+        progress(85, "Exporting quantized model...")
+        # Every stored correction: parity compares the float and quantized
+        # models on real images, so images this run trained on count too
+        images = list(dict.fromkeys(store.object_path(e['hash']) for e in store.entries()))
+        try:
+            export_model(model, images)
+        except Exception as e:
+            # The .h5 model is already published; kiosks simply keep using it
+            progress(88, f"Quantized export skipped: {e}")
+
+    # 5. BOOKKEEPING (Images are kept for the replay buffer)
+    progress(90, "Updating feedback index...")
+    store.mark_trained(upto)
+
+    progress(100, "Complete!")
+    return version